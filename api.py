@@ -0,0 +1,161 @@
+import hashlib
+from flask import Blueprint, Response, abort, jsonify, request
+from sqlalchemy import func
+import clock
+import concurrency
+import serializers
+from models import Artist, Show, Venue, db
+from pagination import parse_date
+
+PER_PAGE = 30
+MAX_PER_PAGE = 100
+SEARCH_LIMIT = 50
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def per_page():
+    return max(min(request.args.get('per_page', PER_PAGE, type=int),
+                   MAX_PER_PAGE), 1)
+
+
+def search_limit():
+    return max(min(request.args.get('limit', SEARCH_LIMIT, type=int),
+                   SEARCH_LIMIT), 1)
+
+
+def select_fields(data):
+    # Keep only the ?fields=a,b keys of a record or list of records
+    fields = request.args.get('fields')
+    if not fields:
+        return data
+    fields = set(fields.split(','))
+    if isinstance(data, list):
+        return [{key: item[key] for key in item.keys() if key in fields}
+                for item in data]
+    return {key: data[key] for key in data.keys() if key in fields}
+
+
+def conditional(version, produce):
+    # Strong ETag from the row versions behind a response (plus the query
+    # arguments shaping it). A matching If-None-Match gets a 304 before
+    # produce() loads or serializes anything.
+    etag = hashlib.sha1(repr(
+        (version, sorted(request.args.items(multi=True)))).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(serializers.dumps(produce()),
+                            mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def list_entities(model):
+    # Keyset page of previews ordered by id; ?after=<last id seen>
+    after = request.args.get('after', 0, type=int)
+    limit = per_page()
+    versions = db.session.query(model.id, model.version)\
+        .filter(model.id > after)\
+        .order_by(model.id)\
+        .limit(limit + 1)\
+        .all()
+    page = versions[:limit]
+
+    def produce():
+        return {
+            "data": select_fields(
+                serializers.previews(model, after=after, limit=limit)),
+            "next": page[-1][0] if len(versions) > limit else None,
+        }
+    return conditional(versions, produce)
+
+
+def entity_details(model, show_fk, counterpart, counterpart_fk, id):
+    # The entity's own version plus its shows' and their counterparts'
+    # versions, and how many shows are upcoming right now
+    now = clock.now()
+    version, shows = concurrency.gather(
+        lambda: db.session.query(model.version)
+        .filter(model.id == id).scalar(),
+        lambda: db.session.query(
+            func.count(Show.id),
+            func.coalesce(func.sum(Show.version + counterpart.version), 0),
+            func.count(Show.id).filter(Show.start_time >= now))
+        .join(counterpart, counterpart_fk == counterpart.id)
+        .filter(show_fk == id)
+        .one())
+    if version is None:
+        abort(404)
+
+    return conditional(
+        (version, tuple(shows)),
+        lambda: select_fields(serializers.details(model, id)))
+
+
+def search_entities(model):
+    results = model.search(request.args.get('q', ''), limit=search_limit())
+    return conditional(results, lambda: {
+        "count": results["count"],
+        "data": select_fields(results["data"]),
+    })
+
+
+@api.route('/venues')
+def venues():
+    return list_entities(Venue)
+
+
+@api.route('/venues/search')
+def search_venues():
+    return search_entities(Venue)
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    return entity_details(Venue, Show.venue_id, Artist, Show.artist_id,
+                          venue_id)
+
+
+@api.route('/artists')
+def artists():
+    return list_entities(Artist)
+
+
+@api.route('/artists/search')
+def search_artists():
+    return search_entities(Artist)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    return entity_details(Artist, Show.artist_id, Venue, Show.venue_id,
+                          artist_id)
+
+
+@api.route('/shows')
+def shows():
+    page, versions, next_cursor, prev_cursor = serializers.show_listing(
+        limit=per_page(),
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        date_from=parse_date(request.args.get('date_from')),
+        date_to=parse_date(request.args.get('date_to')),
+        city=request.args.get('city'),
+        venue_id=request.args.get('venue_id', type=int),
+        artist_id=request.args.get('artist_id', type=int),
+    )
+
+    return conditional(versions, lambda: {
+        "data": select_fields(page),
+        "next": next_cursor,
+        "prev": prev_cursor,
+    })
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def error_response(error):
+    return jsonify({"error": error.description}), error.code
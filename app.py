@@ -3,28 +3,38 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import (Flask, render_template, request,
-                   Response, flash, redirect, url_for, jsonify)
+from flask import (Blueprint, render_template, request,
+                   Response, flash, redirect, url_for, jsonify, abort,
+                   stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from flask_migrate import Migrate
 from forms import ShowForm, VenueForm, ArtistForm
 import datetime
-from models import (Venue, Artist, Show, current_datetime, db, setup_db)
+from models import (Venue, Artist, Show, db, exists, next_show_start)
+import cache
+import dates
+import fragments
+import metrics
+import serializers
+from cache import cached_page
+from pagination import parse_date
+from streaming import stream_template
+import exporter
+import importer
+from exporter import export_rows
+from importer import guess_format, import_catalogue, import_shows, read_records
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
+# The app itself is built by wsgi.create_app()
+main = Blueprint('main', __name__)
 
-setup_db(app)
-
-# TODO: connect to a local postgresql database
+SHOWS_PER_PAGE = 30
+MAX_SHOWS_PER_PAGE = 100
+SEARCH_RESULTS_LIMIT = 50
 
 
 #----------------------------------------------------------------------------#
@@ -33,22 +43,23 @@ setup_db(app)
 
 
 def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+    return dates.format_datetime(value, format)
+
+
+def format_datetimes(values, format='medium'):
+    return dates.format_many(values, format)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+main.add_app_template_filter(format_datetime, 'datetime')
+main.add_app_template_filter(format_datetimes, 'datetimes')
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
+@cached_page('index')
 def index():
     return render_template('pages/home.html')
 
@@ -56,62 +67,38 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')  # Completed
+@main.route('/venues')  # Completed
+@cached_page('venues')
 def venues():
-    #       num_shows should be aggregated based on number of upcoming shows per venue.
-
-    # Get cities and states distictly
-    cities_states = Venue.query.distinct(Venue.city, Venue.state)
-
-    data = []
-    # iterate over the list
-    for cs in cities_states:
-        # Get the list of venues that have the same cities and venues
-        venues_list = Venue.query.filter_by(
-            city=cs.city).filter_by(state=cs.state)
-
-        filtered_data = []
-
-        for venue in venues_list:
-            filtered_data.append(venue.preview_format())
-
-        data.append({
-            "city": cs.city,
-            "state": cs.state,
-            "venues": filtered_data,
-        })
+    # Areas and their venues' upcoming show counts come from a single query
+    data = Venue.areas_format()
+    for area in data:
+        area["tiles"] = fragments.render_each(
+            'fragments/venue_tile.html', 'venue', area["venues"],
+            [(venue["id"], venue["version"]) for venue in area["venues"]])
 
     return render_template('pages/venues.html', areas=data)
 
 
-@app.route('/venues/search', methods=['POST'])  # Completed
+@main.route('/venues/search', methods=['POST'])  # Completed
 def search_venues():
     search_term = request.form.get('search_term', '')
 
-    search_res = Venue.query.filter(
-        Venue.name.ilike('%' + search_term + '%'))
-
-    count = 0
-    for venue in search_res:
-        count += 1
-
-    response = {
-        "count": count,
-        "data": [],
-    }
-
-    for venue in search_res:
-        response["data"].append(venue.preview_format())
+    response = Venue.search(search_term, limit=SEARCH_RESULTS_LIMIT)
 
     return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
 
-@app.route('/venues/<int:venue_id>')  # Completed
+@main.route('/venues/<int:venue_id>')  # Completed
+@cached_page('venue')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-
-    data = venue.details_format()
+    data = cache.cached(
+        'details', ('venue', venue_id),
+        lambda: serializers.details(Venue, venue_id) or abort(404),
+        expires=next_show_start)
+    # the page changes once the next upcoming show has started
+    cache.expire_at(next_show_start(data))
 
     return render_template('pages/show_venue.html', venue=data)
 
@@ -119,13 +106,13 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])  # Completed
+@main.route('/venues/create', methods=['POST'])  # Completed
 def create_venue_submission():
 
     try:
@@ -139,8 +126,8 @@ def create_venue_submission():
         flash('Venue ' + request.form['name'] +
               ' was successfully listed!')
 
-    except Exception as e:
-        print(e)
+    except Exception:
+        metrics.form_failed('create_venue')
         db.session.rollback()
         flash('An error occurred. Venue ' +
               request.form["name"] + ' could not be listed.')
@@ -151,7 +138,7 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])  # Completed
+@main.route('/venues/<venue_id>', methods=['DELETE'])  # Completed
 def delete_venue(venue_id):
 
     try:
@@ -168,53 +155,45 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')  # Completed
+@main.route('/artists')  # Completed
 def artists():
-    all_artists = Artist.query.order_by("id").all()
+    # Streamed: tiles are rendered as the rows come off the cursor
+    tiles = fragments.render_stream(
+        'fragments/artist_tile.html', 'artist',
+        ((artist, (artist.id, artist.version))
+         for artist in serializers.tiles(Artist)))
 
-    data = []
-    for artist in all_artists:
-        data.append(artist.preview_format())
+    return stream_template('pages/artists.html', tiles=tiles)
 
-    return render_template('pages/artists.html', artists=data)
 
-
-@app.route('/artists/search', methods=['POST'])  # Completed
+@main.route('/artists/search', methods=['POST'])  # Completed
 def search_artists():
 
     search_term = request.form.get('search_term', '')
 
-    search_res = Artist.query.filter(
-        Artist.name.ilike('%' + search_term + '%'))
-
-    count = 0
-    for artist in search_res:
-        count += 1
-
-    response = {
-        "count": count,
-        "data": [],
-    }
-
-    for artist in search_res:
-        response["data"].append(artist.preview_format())
+    response = Artist.search(search_term, limit=SEARCH_RESULTS_LIMIT)
 
     return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')  # Completed
+@main.route('/artists/<int:artist_id>')  # Completed
+@cached_page('artist')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
 
-    artist = Artist.query.get(artist_id)
-    data = artist.details_format()
+    data = cache.cached(
+        'details', ('artist', artist_id),
+        lambda: serializers.details(Artist, artist_id) or abort(404),
+        expires=next_show_start)
+    # the page changes once the next upcoming show has started
+    cache.expire_at(next_show_start(data))
     return render_template('pages/show_artist.html', artist=data)
 
 #  Update
 #  ----------------------------------------------------------------
 
 
-@ app.route('/artists/<int:artist_id>/edit', methods=['GET'])  # Completed
+@ main.route('/artists/<int:artist_id>/edit', methods=['GET'])  # Completed
 def edit_artist(artist_id):
 
     artist = Artist.query.get(artist_id)
@@ -222,7 +201,7 @@ def edit_artist(artist_id):
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@ app.route('/artists/<int:artist_id>/edit', methods=['POST'])  # Completed
+@ main.route('/artists/<int:artist_id>/edit', methods=['POST'])  # Completed
 def edit_artist_submission(artist_id):
   
     try:
@@ -231,13 +210,13 @@ def edit_artist_submission(artist_id):
 
         form.populate_obj(artist)
         artist.update()
-    except Exception as e:
-        print(e)
+    except Exception:
+        metrics.form_failed('edit_artist')
         db.session.rollback()
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@ app.route('/venues/<int:venue_id>/edit', methods=['GET'])  # Completed
+@ main.route('/venues/<int:venue_id>/edit', methods=['GET'])  # Completed
 def edit_venue(venue_id):
 
     venue = Venue.query.get(venue_id)
@@ -247,7 +226,7 @@ def edit_venue(venue_id):
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@ app.route('/venues/<int:venue_id>/edit', methods=['POST'])  # Completed
+@ main.route('/venues/<int:venue_id>/edit', methods=['POST'])  # Completed
 def edit_venue_submission(venue_id):
 
     try:
@@ -256,23 +235,23 @@ def edit_venue_submission(venue_id):
         venue = Venue.query.get(venue_id)
         form.populate_obj(venue)
         venue.update()
-    except Exception as e:
-        print(e)
+    except Exception:
+        metrics.form_failed('edit_venue')
         db.session.rollback()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@ app.route('/artists/create', methods=['POST'])  # Completed
+@ main.route('/artists/create', methods=['POST'])  # Completed
 def create_artist_submission():
     # called upon submitting the new artist listing form
     try:
@@ -283,8 +262,8 @@ def create_artist_submission():
         artist.insert()
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    except Exception as e:
-        print(e)
+    except Exception:
+        metrics.form_failed('create_artist')
         db.session.rollback()
         flash('An error occurred. Artist ' +
               request.form['name'] + ' could not be listed.')
@@ -297,34 +276,46 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
-@ app.route('/shows')  # Completed
+@ main.route('/shows')  # Completed
 def shows():
-    # displays list of shows at /shows
-    
-    all_shows = Show.query.all()
-    data = []
+    # displays one page of shows at /shows, optionally filtered
+
+    filters = {
+        key: request.args[key]
+        for key in ('date_from', 'date_to', 'city', 'venue_id', 'artist_id',
+                    'per_page')
+        if request.args.get(key)
+    }
+    per_page = min(request.args.get('per_page', SHOWS_PER_PAGE, type=int),
+                   MAX_SHOWS_PER_PAGE)
+
+    data, versions, next_cursor, prev_cursor = serializers.show_listing(
+        limit=max(per_page, 1),
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        date_from=parse_date(filters.get('date_from')),
+        date_to=parse_date(filters.get('date_to')),
+        city=filters.get('city'),
+        venue_id=request.args.get('venue_id', type=int),
+        artist_id=request.args.get('artist_id', type=int),
+    )
 
-    for show in all_shows:
-        data.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time,
-        })
+    # Keyed on the versions of each show and of its venue and artist
+    tiles = fragments.render_stream('fragments/show_tile.html', 'show',
+                                    zip(data, versions))
 
-    return render_template('pages/shows.html', shows=data)
+    return stream_template('pages/shows.html', tiles=tiles, filters=filters,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
 
 
-@ app.route('/shows/create')
+@ main.route('/shows/create')
 def create_shows():
     # renders form. 
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@ app.route('/shows/create', methods=['POST'])  # Completed
+@ main.route('/shows/create', methods=['POST'])  # Completed
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
   
@@ -334,10 +325,7 @@ def create_show_submission():
         artist_id = form.artist_id.data
         venue_id = form.venue_id.data
 
-        unvaild_id = Artist.query.filter_by(id=artist_id).first(
-        ) is None or Venue.query.filter_by(id=venue_id).first() is None
-
-        if unvaild_id:
+        if not exists(Artist, artist_id) or not exists(Venue, venue_id):
             raise Exception("Artist/Venue doesn't exist")
 
         show = Show(artist_id=artist_id,
@@ -349,8 +337,8 @@ def create_show_submission():
 
     # on successful db insert, flash success
         flash('Show was successfully listed!')
-    except Exception as e:
-        print(e)
+    except Exception:
+        metrics.form_failed('create_show')
         db.session.rollback()
         flash('An error occurred. Show could not be listed.')
     finally:
@@ -361,38 +349,100 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@ app.errorhandler(404)
+#  Bulk import/export
+#  ----------------------------------------------------------------
+
+def uploaded_records():
+    # records of an uploaded file field or of the raw request body, as CSV,
+    # NDJSON or a JSON array
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        format = request.args.get('format') or guess_format(
+            upload.filename, upload.content_type)
+    else:
+        stream = request.stream
+        format = request.args.get('format') or guess_format(
+            None, request.content_type)
+    if format not in importer.FORMATS:
+        abort(400)
+    return read_records(stream, format)
+
+
+def export_response(model, name):
+    # streams the whole table as CSV or NDJSON
+    format = request.args.get('format', 'csv')
+    if format not in exporter.FORMATS:
+        abort(400)
+    mimetype = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_rows(model, format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition':
+                 'attachment; filename=%s.%s' % (name, format)})
+
+
+@ main.route('/shows/import', methods=['POST'])
+def import_shows_submission():
+    # bulk loads shows, skipping those already listed, and reports the
+    # rejected records
+    report = import_shows(uploaded_records())
+    return jsonify(report.format())
+
+
+@ main.route('/venues/import', methods=['POST'])
+def import_venues_submission():
+    # bulk loads venues, updating those with the same name, city and state
+    report = import_catalogue(Venue, uploaded_records())
+    return jsonify(report.format())
+
+
+@ main.route('/artists/import', methods=['POST'])
+def import_artists_submission():
+    # bulk loads artists, updating those with the same name, city and state
+    report = import_catalogue(Artist, uploaded_records())
+    return jsonify(report.format())
+
+
+@ main.route('/venues/export')
+def export_venues():
+    return export_response(Venue, 'venues')
+
+
+@ main.route('/artists/export')
+def export_artists():
+    return export_response(Artist, 'artists')
+
+
+@ main.route('/shows/export')
+def export_shows():
+    return export_response(Show, 'shows')
+
+
+@ main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@ app.errorhandler(500)
+@ main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
+# Development server, see gunicorn.conf.py for production.
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    from wsgi import create_app
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
+    from wsgi import create_app
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
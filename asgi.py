@@ -0,0 +1,12 @@
+# ASGI entry point, for serving Fyyur from an ASGI server such as uvicorn:
+#
+#     uvicorn asgi:application --workers 4
+#
+# The views stay synchronous (Flask 1.1 has no async views); asgiref runs
+# each request in its thread pool while the server's event loop keeps
+# accepting connections. Within a request, the independent queries of a
+# page run concurrently (see concurrency.py).
+from asgiref.wsgi import WsgiToAsgi
+from wsgi import create_app
+
+application = WsgiToAsgi(create_app())
@@ -0,0 +1,243 @@
+"""Load test of every Fyyur route, with JSON baselines to compare runs.
+
+Drives each route from --concurrency threads, --requests times, and records
+p50/p95/p99 latency, queries per request (from the request log, see
+instrumentation.py) and throughput. The page cache is disabled unless --cache is given, so
+every request reaches the database. Seed a scratch database first:
+
+    flask seed --scale small
+    python benchmarks/routes.py run --output before.json
+    ... change something ...
+    python benchmarks/routes.py run --output after.json
+    python benchmarks/routes.py compare before.json after.json
+
+compare exits with status 1 when a route got slower than --threshold (in
+percent, at p95) or issues more queries per request than before.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import create_app  # noqa: E402
+import instrumentation  # noqa: E402
+from models import db, Artist, Venue  # noqa: E402
+from seeding import CITIES, WORDS  # noqa: E402
+
+app = create_app()
+
+# name: (method, url, form); {placeholders} are filled per request
+ROUTES = {
+    'home': ('GET', '/', None),
+    'venues': ('GET', '/venues', None),
+    'artists': ('GET', '/artists', None),
+    'shows': ('GET', '/shows', None),
+    'shows_by_city': ('GET', '/shows?city={city}', None),
+    'venue': ('GET', '/venues/{venue_id}', None),
+    'artist': ('GET', '/artists/{artist_id}', None),
+    'search_venues': ('POST', '/venues/search', {'search_term': '{term}'}),
+    'search_artists': ('POST', '/artists/search', {'search_term': '{term}'}),
+    'api_venues': ('GET', '/api/v1/venues', None),
+    'api_venue': ('GET', '/api/v1/venues/{venue_id}', None),
+    'api_shows': ('GET', '/api/v1/shows', None),
+    'create_venue': ('POST', '/venues/create', {
+        'name': 'Benchmark Venue {unique}', 'city': '{city}', 'state': 'CA',
+        'address': '1 Main St', 'phone': '555-555-5555', 'genres': 'Jazz'}),
+    'create_artist': ('POST', '/artists/create', {
+        'name': 'Benchmark Artist {unique}', 'city': '{city}', 'state': 'CA',
+        'phone': '555-555-5555', 'genres': 'Jazz'}),
+    'create_show': ('POST', '/shows/create', {
+        'artist_id': '{artist_id}', 'venue_id': '{venue_id}',
+        'start_time': '{start_time}'}),
+}
+WRITES = ('create_venue', 'create_artist', 'create_show')
+
+_unique = itertools.count()
+_unique_lock = threading.Lock()
+
+
+class LastRecord(logging.Handler):
+    # Keeps the last request record logged in each thread: the test client
+    # runs the app, and closes streamed responses, in the calling thread
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.local = threading.local()
+
+    def emit(self, record):
+        self.local.record = json.loads(record.getMessage())
+
+
+last_record = LastRecord()
+instrumentation.logger.addHandler(last_record)
+
+
+def placeholders(venue_ids, artist_ids):
+    with _unique_lock:
+        unique = '%d-%d' % (os.getpid(), next(_unique))
+    start_time = datetime.datetime.utcnow() + datetime.timedelta(
+        days=random.randint(1, 365), seconds=random.randrange(86400))
+    return {
+        'venue_id': random.choice(venue_ids),
+        'artist_id': random.choice(artist_ids),
+        'city': random.choice(CITIES)[0],
+        'term': random.choice(WORDS)[:random.randint(2, 5)],
+        'unique': unique,
+        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def request_once(route, venue_ids, artist_ids):
+    # A fresh client per request: no cookies, hence no flashed messages,
+    # carry over from one request to the next
+    method, url, form = ROUTES[route]
+    values = placeholders(venue_ids, artist_ids)
+    url = url.format(**values)
+    data = {key: value.format(**values) for key, value in form.items()} \
+        if form else None
+    client = app.test_client()
+    start = time.perf_counter()
+    last_record.local.record = None
+    response = client.open(url, method=method, data=data)
+    # Streamed pages are rendered as their body is read, and logged once
+    # the response is closed
+    response.get_data()
+    response.close()
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 400:
+        raise RuntimeError('%s %s: %d' % (method, url, response.status_code))
+    record = last_record.local.record
+    return elapsed, record['queries'] if record else None
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+def measure(route, requests, concurrency, venue_ids, artist_ids):
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(
+            lambda _: request_once(route, venue_ids, artist_ids),
+            range(requests)))
+        elapsed = time.perf_counter() - start
+    timings = sorted(timing for timing, queries in results)
+    queries = [queries for timing, queries in results if queries is not None]
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'queries_per_request': round(statistics.mean(queries), 2)
+        if queries else None,
+        'requests_per_second': round(requests / elapsed, 1),
+    }
+
+
+def run(args):
+    app.config['SERVER_TIMING'] = True
+    if not args.cache:
+        app.config['CACHE_TTL'] = 0
+    routes = args.routes or [route for route in ROUTES
+                             if not (args.read_only and route in WRITES)]
+    with app.app_context():
+        venue_ids = [id for id, in db.session.query(Venue.id).limit(10000)]
+        artist_ids = [id for id, in db.session.query(Artist.id).limit(10000)]
+        counts = {'venues': Venue.query.count(), 'artists': Artist.query.count()}
+    if not venue_ids or not artist_ids:
+        sys.exit('No venues or artists, run `flask seed` first')
+
+    results = {}
+    print('%-16s %9s %9s %9s %9s %9s' % (
+        'route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'req/s'))
+    for route in routes:
+        # Warm up connections, templates and the search indexes
+        measure(route, args.concurrency, args.concurrency, venue_ids,
+                artist_ids)
+        result = measure(route, args.requests, args.concurrency, venue_ids,
+                         artist_ids)
+        results[route] = result
+        print('%-16s %9.2f %9.2f %9.2f %9s %9.1f' % (
+            route, result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            result['queries_per_request'], result['requests_per_second']))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'meta': dict(counts, **{
+                    'date': datetime.datetime.utcnow().isoformat(),
+                    'python': platform.python_version(),
+                    'concurrency': args.concurrency,
+                    'cache': args.cache,
+                }),
+                'routes': results,
+            }, file, indent=2, sort_keys=True)
+
+
+def compare(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)['routes']
+    with open(args.current) as file:
+        current = json.load(file)['routes']
+
+    regressions = 0
+    print('%-16s %10s %10s %8s %12s' % (
+        'route', 'p95 before', 'p95 after', 'change', 'queries'))
+    for route in sorted(set(baseline) & set(current)):
+        before, after = baseline[route], current[route]
+        change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100
+        more_queries = (after['queries_per_request'] or 0) > \
+            (before['queries_per_request'] or 0)
+        regressed = change > args.threshold or more_queries
+        regressions += regressed
+        print('%-16s %10.2f %10.2f %+7.1f%% %5s -> %-5s %s' % (
+            route, before['p95_ms'], after['p95_ms'], change,
+            before['queries_per_request'], after['queries_per_request'],
+            'REGRESSION' if regressed else ''))
+    for route in sorted(set(baseline) ^ set(current)):
+        print('%-16s only in %s' % (
+            route, 'baseline' if route in baseline else 'current'))
+    if regressions:
+        sys.exit('%d routes regressed' % regressions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Benchmark the routes.')
+    run_parser.add_argument('--requests', type=int, default=200)
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--routes', nargs='+', choices=sorted(ROUTES))
+    run_parser.add_argument('--read-only', action='store_true',
+                            help='Skip the routes creating rows.')
+    run_parser.add_argument('--cache', action='store_true',
+                            help='Keep the page cache enabled.')
+    run_parser.add_argument('--output', help='JSON file for the results.')
+    run_parser.set_defaults(function=run)
+
+    compare_parser = commands.add_parser(
+        'compare', help='Diff two result files.')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=20,
+                                help='Allowed p95 slowdown, in percent.')
+    compare_parser.set_defaults(function=compare)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
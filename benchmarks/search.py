@@ -0,0 +1,86 @@
+"""Venue and artist search latency over a large synthetic catalogue.
+
+Fills Venue and Artist with synthetic rows (1M each by default), then times
+the search views for a handful of name, prefix and "City, ST" terms. Run
+against a scratch PostgreSQL database that has the pg_trgm migration
+applied:
+
+    python benchmarks/search.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import create_app  # noqa: E402
+from models import db, Venue, Artist  # noqa: E402
+
+app = create_app()
+
+BATCH_SIZE = 10000
+CITIES = [('Seattle', 'WA'), ('San Francisco', 'CA'), ('New York', 'NY'),
+          ('Austin', 'TX'), ('Chicago', 'IL'), ('Portland', 'OR')]
+WORDS = ['Park', 'Square', 'Live', 'Music', 'Hall', 'Dueling', 'Pianos',
+         'Bar', 'Coffee', 'Club', 'Guns', 'Roses', 'Matt', 'Quevedo',
+         'Wild', 'Sax', 'Band', 'Lounge', 'Theatre', 'Garden']
+TERMS = ['Hall', 'Park Sq', 'music', 'Seattle, WA', 'san fran', 'Qu', 'zzzz']
+
+
+def random_name():
+    words = random.sample(WORDS, random.randint(2, 4))
+    suffix = ''.join(random.choice(string.ascii_lowercase) for _ in range(4))
+    return ' '.join(words) + ' ' + suffix
+
+
+def fill(model, rows):
+    remaining = rows - model.query.count()
+    while remaining > 0:
+        batch = min(remaining, BATCH_SIZE)
+        values = []
+        for _ in range(batch):
+            city, state = random.choice(CITIES)
+            values.append({"name": random_name(), "city": city, "state": state})
+        db.session.execute(model.__table__.insert(), values)
+        db.session.commit()
+        remaining -= batch
+    db.session.execute('ANALYZE "%s"' % model.__tablename__)
+    db.session.commit()
+
+
+def time_search(client, url, term, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.post(url, data={'search_term': term})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, term)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=15)
+    args = parser.parse_args()
+
+    with app.app_context():
+        fill(Venue, args.rows)
+        fill(Artist, args.rows)
+        client = app.test_client()
+
+        print('%-16s %14s %14s' % ('term', 'venues ms', 'artists ms'))
+        for term in TERMS:
+            print('%-16s %14.2f %14.2f' % (
+                term,
+                time_search(client, '/venues/search', term, args.repeat),
+                time_search(client, '/artists/search', term, args.repeat),
+            ))
+
+
+if __name__ == '__main__':
+    main()
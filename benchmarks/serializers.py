@@ -0,0 +1,245 @@
+"""The models' original *_format() code against the column-tuple serializers.
+
+Times building the artist previews, a venue details page and a page of the
+show listing three ways:
+
+- original: a copy of the per-row *_format() methods the models first had.
+  Each preview counts its upcoming shows with a query, the details run
+  their show queries again for the counts, and each show lazy loads its
+  counterpart. The show queries are scoped to their owner; the first
+  version joined every show.
+- orm: the model methods as they were when serializers.py replaced them,
+  with shows eager loaded by selectinload and materialized counters.
+- tuples: serializers.py.
+
+Plus JSON encoding of the results with the json module and with orjson (when
+installed). Run against a scratch database holding some data, e.g. one
+filled by benchmarks/search.py:
+
+    python benchmarks/serializers.py --repeat 50 --per-page 100
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import create_app  # noqa: E402
+import cache  # noqa: E402
+import clock  # noqa: E402
+import serializers  # noqa: E402
+from models import db, Artist, Show, Venue  # noqa: E402
+from pagination import keyset_page  # noqa: E402
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        # No path may be served from the identity map or the cache
+        db.session.expunge_all()
+        cache.backend.clear()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def busiest_venue():
+    return db.session.query(Show.venue_id)\
+        .group_by(Show.venue_id)\
+        .order_by(db.func.count(Show.id).desc())\
+        .limit(1).scalar()
+
+
+# The original path, one query per preview and per show list
+
+
+def original_shows(model, id, upcoming):
+    show_fk = Show.venue_id if model is Venue else Show.artist_id
+    query = Show.query.filter(show_fk == id)
+    if upcoming:
+        return query.filter(Show.start_time >= clock.now())\
+            .order_by(Show.start_time)
+    return query.filter(Show.start_time < clock.now())\
+        .order_by(Show.start_time.desc())
+
+
+def original_format_shows(model, id, upcoming):
+    counterpart = 'artist' if model is Venue else 'venue'
+    return [orm_show(show, counterpart)
+            for show in original_shows(model, id, upcoming)]
+
+
+def original_previews(model):
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": len(original_format_shows(model, row.id, True)),
+    } for row in model.query.order_by(model.id)]
+
+
+def original_details(model, id):
+    row = model.query.get(id)
+    if model is Venue:
+        data = {
+            "id": row.id,
+            "name": row.name,
+            "genres": row.genres,
+            "address": row.address,
+            "city": row.city,
+            "state": row.state,
+            "phone": row.phone,
+            "website": row.website_link,
+            "facebook_link": row.facebook_link,
+            "seeking_talent": row.seeking_talent,
+            "seeking_description": row.seeking_description,
+            "image_link": row.image_link,
+        }
+    else:
+        data = {
+            "id": row.id,
+            "name": row.name,
+            "genres": row.genres,
+            "city": row.city,
+            "state": row.state,
+            "phone": row.phone,
+            "seeking_venue": row.seeking_venue,
+            "image_link": row.image_link,
+            "seeking_description": row.seeking_description,
+            "website": row.website_link,
+            "facebook_link": row.facebook_link,
+        }
+    data.update({
+        "past_shows": original_format_shows(model, id, False),
+        "upcoming_shows": original_format_shows(model, id, True),
+        "past_shows_count": len(original_format_shows(model, id, False)),
+        "upcoming_shows_count": len(original_format_shows(model, id, True)),
+    })
+    return data
+
+
+def original_show_listing(limit):
+    shows = Show.query.order_by(Show.start_time, Show.id).limit(limit)
+    return [{
+        "venue_id": show.venue_id,
+        "venue_name": show.venue.name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist.name,
+        "artist_image_link": show.artist.image_link,
+        "start_time": show.start_time,
+    } for show in shows]
+
+
+# The ORM path: model instances loaded with their relationships, then turned
+# into dicts with the same keys as the serializers' records
+
+
+def orm_previews(model):
+    return [{
+        "id": row.id,
+        "name": row.name,
+        "num_upcoming_shows": row.upcoming_show_count,
+    } for row in model.query.order_by(model.id)]
+
+
+def orm_show(show, counterpart):
+    other = getattr(show, counterpart)
+    return {
+        "%s_id" % counterpart: other.id,
+        "%s_name" % counterpart: other.name,
+        "%s_image_link" % counterpart: other.image_link,
+        "start_time": show.start_time,
+    }
+
+
+def orm_venue_details(venue_id):
+    # The venue and all its shows with their artists, in two queries
+    venue = Venue.query.options(
+        db.selectinload(Venue.shows).joinedload(Show.artist)
+    ).filter_by(id=venue_id).one()
+    now = clock.now()
+    shows = sorted(venue.shows, key=lambda show: show.start_time)
+    past = [orm_show(show, 'artist') for show in reversed(shows)
+            if show.start_time < now]
+    upcoming = [orm_show(show, 'artist') for show in shows
+                if show.start_time >= now]
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past,
+        "upcoming_shows": upcoming,
+        "past_shows_count": len(past),
+        "upcoming_shows_count": len(upcoming),
+    }
+
+
+def orm_show_listing(limit):
+    # One page of shows with the venue and artist joined into the statement
+    query = Show.query.join(Show.venue).join(Show.artist)\
+        .options(db.contains_eager(Show.venue), db.contains_eager(Show.artist))
+    shows = keyset_page(query, (Show.start_time, Show.id), limit)[0]
+    return [{
+        "venue_id": show.venue_id,
+        "venue_name": show.venue.name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist.name,
+        "artist_image_link": show.artist.image_link,
+        "start_time": show.start_time,
+    } for show in shows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--per-page', type=int, default=100)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.test_request_context():
+        venue_id = busiest_venue() or 1
+        cases = [
+            ('artist previews',
+             lambda: original_previews(Artist),
+             lambda: orm_previews(Artist),
+             lambda: serializers.previews(Artist)),
+            ('venue details',
+             lambda: original_details(Venue, venue_id),
+             lambda: orm_venue_details(venue_id),
+             lambda: serializers.details(Venue, venue_id)),
+            ('show listing',
+             lambda: original_show_listing(args.per_page),
+             lambda: orm_show_listing(args.per_page),
+             lambda: serializers.show_listing(limit=args.per_page)[0]),
+        ]
+
+        print('%-18s %12s %12s %12s %12s %12s' % (
+            'case', 'original ms', 'orm ms', 'tuples ms', 'json ms',
+            'orjson ms'))
+        for name, original, orm, tuples in cases:
+            data = tuples()
+            print('%-18s %12.2f %12.2f %12.2f %12.2f %12s' % (
+                name,
+                timed(original, args.repeat),
+                timed(orm, args.repeat),
+                timed(tuples, args.repeat),
+                timed(lambda: json.dumps(data, default=serializers.default),
+                      args.repeat),
+                '%.2f' % timed(lambda: serializers.dumps(data), args.repeat)
+                if serializers.orjson is not None else 'n/a',
+            ))
+
+if __name__ == '__main__':
+    main()
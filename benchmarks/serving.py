@@ -0,0 +1,131 @@
+"""Throughput of the sync (WSGI) and ASGI serving modes.
+
+Serves the app with Werkzeug's threaded WSGI server and with uvicorn over
+asgi.py's adapter, each with the concurrent page queries off and on, and fires the
+same mix of requests at each from --concurrency client threads. The page
+cache is disabled so every request reaches the database. Run against a
+database holding some data, e.g. one filled by benchmarks/search.py:
+
+    python benchmarks/serving.py --requests 2000 --concurrency 32
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import WSGIRequestHandler, make_server  # noqa: E402
+from wsgi import create_app  # noqa: E402
+from models import db, Artist, Venue  # noqa: E402
+
+app = create_app()
+
+PATHS = ['/venues', '/artists', '/shows', '/venues/%d', '/artists/%d',
+         '/api/v1/venues/%d', '/api/v1/artists/%d']
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class SyncServer:
+
+    def __init__(self, port):
+        self.server = make_server('127.0.0.1', port, app, threaded=True,
+                                  request_handler=QuietHandler)
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+class AsgiServer:
+
+    def __init__(self, port):
+        import uvicorn
+        from asgiref.wsgi import WsgiToAsgi
+        # The app of asgi.py, but the one configured by main()
+        self.server = uvicorn.Server(uvicorn.Config(
+            WsgiToAsgi(app), host='127.0.0.1', port=port, log_level='warning'))
+        # Signals are only handled by the main thread
+        self.server.install_signal_handlers = lambda: None
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def urls(port, count):
+    with app.app_context():
+        venue_ids = [id for id, in db.session.query(Venue.id).limit(50)]
+        artist_ids = [id for id, in db.session.query(Artist.id).limit(50)]
+    for number in range(count):
+        path = PATHS[number % len(PATHS)]
+        if '%d' in path:
+            ids = artist_ids if 'artist' in path else venue_ids
+            path = path % ids[number % len(ids)]
+        yield 'http://127.0.0.1:%d%s' % (port, path)
+
+
+def fetch(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run(server, port, args):
+    with server(port):
+        targets = list(urls(port, args.requests))
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(fetch, targets[:args.concurrency]))  # warm up
+            start = time.perf_counter()
+            timings = sorted(pool.map(fetch, targets))
+            elapsed = time.perf_counter() - start
+    return (len(timings) / elapsed,
+            statistics.median(timings) * 1000,
+            timings[int(len(timings) * 0.95) - 1] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--parallel-queries', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5050)
+    args = parser.parse_args()
+
+    app.config['CACHE_TTL'] = 0
+    modes = [
+        ('sync', SyncServer, 0),
+        ('sync', SyncServer, args.parallel_queries),
+        ('asgi', AsgiServer, 0),
+        ('asgi', AsgiServer, args.parallel_queries),
+    ]
+    print('%-6s %8s %12s %10s %10s' % (
+        'mode', 'parallel', 'requests/s', 'p50 ms', 'p95 ms'))
+    for number, (name, server, parallel) in enumerate(modes):
+        app.config['DB_PARALLEL_QUERIES'] = parallel
+        print('%-6s %8d %12.1f %10.2f %10.2f' % (
+            (name, parallel) + run(server, args.port + number, args)))
+
+
+if __name__ == '__main__':
+    main()
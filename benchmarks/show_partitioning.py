@@ -0,0 +1,102 @@
+"""Detail page latency as the Show table grows.
+
+Creates one probe venue and one probe artist with a fixed number of shows,
+then keeps adding filler shows for other venues/artists and re-measures the
+probe pages. With the scoped, index-backed upcoming/past queries the probe
+latency should stay flat no matter how big the Show table gets.
+
+Run against a scratch database, it inserts a lot of rows:
+
+    python benchmarks/show_partitioning.py --steps 10000 100000 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsgi import create_app  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+
+app = create_app()
+
+BATCH_SIZE = 10000
+
+
+def insert_filler_shows(count, venue_ids, artist_ids):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    remaining = count
+    while remaining > 0:
+        batch = min(remaining, BATCH_SIZE)
+        db.session.execute(Show.__table__.insert(), [{
+            "venue_id": random.choice(venue_ids),
+            "artist_id": random.choice(artist_ids),
+            "start_time": now + datetime.timedelta(hours=random.randint(-24 * 365, 24 * 365)),
+        } for _ in range(batch)])
+        db.session.commit()
+        remaining -= batch
+
+
+def time_page(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, url
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, nargs='+',
+                        default=[10000, 100000, 1000000],
+                        help='total Show rows to measure at')
+    parser.add_argument('--entities', type=int, default=1000,
+                        help='filler venues and artists to spread shows over')
+    parser.add_argument('--probe-shows', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=25)
+    args = parser.parse_args()
+
+    with app.app_context():
+        venues = [Venue(name='Bench venue %d' % i, city='Bench', state='BN')
+                  for i in range(args.entities)]
+        artists = [Artist(name='Bench artist %d' % i, city='Bench', state='BN')
+                   for i in range(args.entities)]
+        probe_venue = Venue(name='Probe venue', city='Bench', state='BN')
+        probe_artist = Artist(name='Probe artist', city='Bench', state='BN')
+        db.session.add_all(venues + artists + [probe_venue, probe_artist])
+        db.session.commit()
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for i in range(args.probe_shows):
+            db.session.add(Show(venue_id=probe_venue.id, artist_id=probe_artist.id,
+                                start_time=now + datetime.timedelta(days=i - args.probe_shows // 2)))
+        db.session.commit()
+
+        venue_ids = [venue.id for venue in venues]
+        artist_ids = [artist.id for artist in artists]
+        venue_url = '/venues/%d' % probe_venue.id
+        artist_url = '/artists/%d' % probe_artist.id
+
+        client = app.test_client()
+        print('%12s %14s %14s' % ('shows', 'venue ms', 'artist ms'))
+        for step in sorted(args.steps):
+            missing = step - Show.query.count()
+            if missing > 0:
+                insert_filler_shows(missing, venue_ids, artist_ids)
+            db.session.execute('ANALYZE "Show"')
+            db.session.commit()
+            print('%12d %14.2f %14.2f' % (
+                step,
+                time_page(client, venue_url, args.repeat),
+                time_page(client, artist_url, args.repeat),
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, session
+import clock
+import metrics
+
+# What is cached for each entity key such as ('venue', 1): its rendered page
+# and its details record from serializers.details().
+VARIANTS = ('page', 'details')
+
+INVALIDATION_CHANNEL = 'fyyur:invalidate'
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class LRUCache:
+    # In-memory backend: a thread safe LRU bounded by the approximate size
+    # in bytes of the values it holds, with a per-entry expiry time. A
+    # value's size is that of its pickle, which covers the records and
+    # lists it holds (sys.getsizeof() only counts the outer object).
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        value, size, expires_at = self._entries.pop(key)
+        self.size -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    # Backend shared by all workers, on any server speaking the Redis
+    # protocol. Takes a client so tests can pass a fakeredis instance.
+
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _name(self, key):
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    def get(self, key):
+        value = self.client.get(self._name(key))
+        return pickle.loads(value) if value is not None else None
+
+    def get_many(self, keys):
+        # One round trip for all of them
+        if not keys:
+            return []
+        return [pickle.loads(value) if value is not None else None
+                for value in self.client.mget([self._name(key) for key in keys])]
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self._name(key), pickle.dumps(value),
+                        ex=max(int(ttl), 1) if ttl is not None else None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self._name(key) for key in keys])
+
+    def clear(self):
+        for name in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(name)
+
+
+backend = LRUCache(max_bytes=MAX_BYTES)
+# Redis client used to tell other workers about invalidations, if any
+publisher = None
+
+
+def init_app(app):
+    global backend, publisher
+    redis_url = app.config.get('CACHE_REDIS_URL')
+    if app.config.get('CACHE_BACKEND', 'memory') == 'redis':
+        backend = RedisCache.from_url(redis_url)
+    else:
+        backend = LRUCache(max_bytes=app.config.get('CACHE_MAX_BYTES',
+                                                     MAX_BYTES))
+    if redis_url:
+        publisher = RedisCache.from_url(redis_url).client
+        if isinstance(backend, LRUCache):
+            subscribe(publisher)
+
+
+def subscribe(client):
+    # Evict keys invalidated by other workers from this worker's memory
+    def on_message(message):
+        keys = json.loads(message['data'])
+        if keys == '*':
+            backend.clear()
+        else:
+            backend.delete(*[tuple(key) for key in keys])
+
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(**{INVALIDATION_CHANNEL: on_message})
+    return pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+
+def invalidate(*keys):
+    # Drop every cached variant of the given entity keys here and, through
+    # the invalidation channel, in every other worker.
+    keys = [(variant,) + tuple(key) for key in keys for variant in VARIANTS]
+    backend.delete(*keys)
+    if publisher is not None and keys:
+        publisher.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+
+def clear():
+    # Drop everything, e.g. after bulk loads touching unknown rows
+    backend.clear()
+    if publisher is not None:
+        publisher.publish(INVALIDATION_CHANNEL, json.dumps('*'))
+
+
+def _ttl(boundary):
+    ttl = current_app.config.get('CACHE_TTL', 300)
+    if g.get('db_replica') is not None:
+        ttl = min(ttl, current_app.config.get('CACHE_REPLICA_TTL', ttl))
+    if boundary is not None:
+        ttl = min(ttl, (boundary - clock.now()).total_seconds())
+    return ttl
+
+
+def _lookup(key):
+    # Cached value of key, or None. A user who has just written is not served
+    # from the cache: a lagging replica may have refilled it with data from
+    # before their write. What they read from the primary is cached.
+    if g.get('db_sticky'):
+        return None
+    return backend.get(key)
+
+
+def cached(variant, key, producer, expires=None):
+    # Value of producer() cached under the entity key. expires(value) may
+    # return the instant after which the value is stale.
+    key = (variant,) + tuple(key)
+    value = _lookup(key)
+    metrics.cache_lookup(variant, value is not None)
+    if value is None:
+        value = producer()
+        ttl = _ttl(expires(value) if expires is not None else None)
+        if ttl > 0:
+            backend.set(key, value, ttl=ttl)
+    return value
+
+
+def expire_at(boundary):
+    # Called by a cached view: the page must not outlive this instant, e.g.
+    # the start of the next upcoming show it lists.
+    if boundary is not None:
+        g.cache_expires_at = boundary
+
+
+def cached_page(name):
+    # Caches the rendered page of a GET view under (name, *view_args). Models
+    # evict the keys they affect on insert/update/delete (see cache_keys()).
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # Pages with pending flash messages are per-user
+            if '_flashes' in session:
+                return view(**kwargs)
+
+            key = ('page', name) + tuple(kwargs.values())
+            page = _lookup(key)
+            metrics.cache_lookup('page', page is not None)
+            if page is not None:
+                return page
+
+            page = view(**kwargs)
+            if isinstance(page, str):
+                ttl = _ttl(g.pop('cache_expires_at', None))
+                if ttl > 0:
+                    backend.set(key, page, ttl=ttl)
+            return page
+        return wrapper
+    return decorator
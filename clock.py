@@ -0,0 +1,38 @@
+import datetime
+from contextlib import contextmanager
+from flask import g, has_app_context
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# Where the current time comes from, swapped out by freeze()
+_source = utcnow
+
+
+def now():
+    # Read once per request (or app context) and reused afterwards, so every
+    # upcoming/past split on a page agrees on the same instant.
+    if not has_app_context():
+        return _source()
+    if 'now' not in g:
+        g.now = _source()
+    return g.now
+
+
+@contextmanager
+def freeze(at):
+    # Pin the clock to a fixed instant, e.g. in tests and benchmarks:
+    #     with clock.freeze(datetime.datetime(2021, 7, 1, tzinfo=utc)): ...
+    global _source
+    previous = _source
+    _source = lambda: at
+    if has_app_context():
+        g.pop('now', None)
+    try:
+        yield at
+    finally:
+        _source = previous
+        if has_app_context():
+            g.pop('now', None)
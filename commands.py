@@ -0,0 +1,170 @@
+import json
+import sys
+import click
+from flask.cli import with_appcontext
+import exporter
+import importer
+import plans
+import seeding
+from importer import BATCH_SIZE, guess_format, read_records
+from models import (Artist, Show, Venue, db, rebuild_show_counters,
+                    roll_show_counters)
+
+# Tables handled by the bulk import/export commands
+CATALOGUE = {'venues': Venue, 'artists': Artist, 'shows': Show}
+
+
+@click.command('roll-show-counters')
+@with_appcontext
+def roll_show_counters_command():
+    """Move shows that have started from the upcoming to the past counters.
+
+    Meant to run periodically (cron, Heroku Scheduler); listings show
+    upcoming counts as of the last run.
+    """
+    click.echo('%d shows moved from upcoming to past' % roll_show_counters())
+
+
+@click.command('rebuild-show-counters')
+@with_appcontext
+def rebuild_show_counters_command():
+    """Recount venue and artist shows from scratch, reporting any drift.
+
+    Exits with status 1 if any counter had to be corrected.
+    """
+    drifted = rebuild_show_counters()
+    for table, id, stored, actual in drifted:
+        click.echo('%s %d: upcoming/past %d/%d, should be %d/%d' % (
+            (table, id) + stored + actual))
+    click.echo('%d rows corrected' % len(drifted))
+    if drifted:
+        sys.exit(1)
+
+
+@click.command('import')
+@click.argument('table', type=click.Choice(sorted(CATALOGUE)))
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', type=click.Choice(importer.FORMATS),
+              help='Input format, guessed from the file name by default.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_command(table, file, format, batch_size):
+    """Bulk load venues, artists or shows from a CSV, NDJSON or JSON file.
+
+    Use '-' as FILE for stdin. Venues and artists are updated when one with
+    the same name, city and state exists; shows already listed are skipped.
+    Invalid records are reported by their position in the input and skipped.
+    """
+    records = read_records(file, format or guess_format(file.name))
+    if table == 'shows':
+        report = importer.import_shows(records, batch_size=batch_size)
+    else:
+        report = importer.import_catalogue(
+            CATALOGUE[table], records, batch_size=batch_size)
+    for error in report.errors:
+        click.echo('record %(record)d: %(error)s' % error, err=True)
+    click.echo('%d %s loaded, %d records rejected' % (
+        report.loaded, table, report.error_count))
+    if report.error_count:
+        sys.exit(1)
+
+
+@click.command('import-shows')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', type=click.Choice(importer.FORMATS))
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@click.pass_context
+def import_shows_command(context, file, format, batch_size):
+    """Bulk load shows; same as `flask import shows`."""
+    context.invoke(import_command, table='shows', file=file, format=format,
+                   batch_size=batch_size)
+
+
+@click.command('export')
+@click.argument('table', type=click.Choice(sorted(CATALOGUE)))
+@click.argument('file', type=click.File('w'), default='-')
+@click.option('--format', type=click.Choice(exporter.FORMATS),
+              default='csv', show_default=True)
+@with_appcontext
+def export_command(table, file, format):
+    """Stream every venue, artist or show to FILE (stdout by default)."""
+    for chunk in exporter.export_rows(CATALOGUE[table], format):
+        file.write(chunk)
+
+
+@click.command('seed')
+@click.option('--scale', type=click.Choice(sorted(seeding.SCALES)),
+              default='small', show_default=True,
+              help='Preset numbers of venues, artists and shows.')
+@click.option('--venues', type=int, help='Overrides the scale.')
+@click.option('--artists', type=int, help='Overrides the scale.')
+@click.option('--shows', type=int, help='Overrides the scale.')
+@click.option('--skew', default=1.1, show_default=True,
+              help='Zipf exponent of venue and artist popularity.')
+@click.option('--seed', 'random_seed', type=int, default=0, show_default=True,
+              help='Random seed, for reproducible data.')
+@with_appcontext
+def seed_command(scale, venues, artists, shows, skew, random_seed):
+    """Fill the database with synthetic venues, artists and shows.
+
+    Meant for benchmarks (see benchmarks/routes.py) on a scratch database:
+    'small' is 10k shows, 'large' 1M.
+    """
+    default_venues, default_artists, default_shows = seeding.SCALES[scale]
+    seeding.seed(default_venues if venues is None else venues,
+                 default_artists if artists is None else artists,
+                 default_shows if shows is None else shows,
+                 skew=skew, random_seed=random_seed)
+    click.echo('%d venues, %d artists and %d shows in the database' % (
+        Venue.query.count(), Artist.query.count(), Show.query.count()))
+
+
+@click.command('check-plans')
+@click.option('--baseline', default=plans.BASELINE, show_default=True,
+              help='JSON file of the expected plans.')
+@click.option('--update', is_flag=True,
+              help='Record the current plans as the baseline instead.')
+@click.option('--min-rows', default=plans.LARGE_TABLE_ROWS, show_default=True,
+              help='Tables with fewer rows are not checked.')
+@with_appcontext
+def check_plans_command(baseline, update, min_rows):
+    """Check the query plans of the app's named queries against a baseline.
+
+    Fails (status 1) when a plan scans a large table sequentially, or from
+    a new nested loop, where the baseline plan used an index. Needs
+    PostgreSQL, with data at a realistic scale (see `flask seed`).
+    """
+    if db.session.bind.dialect.name != 'postgresql':
+        raise click.ClickException('Query plans need PostgreSQL')
+    current = plans.capture()
+    if update:
+        with open(baseline, 'w') as file:
+            json.dump(current, file, indent=2, sort_keys=True)
+        click.echo('%d plans written to %s' % (len(current), baseline))
+        return
+
+    try:
+        with open(baseline) as file:
+            expected = json.load(file)
+    except FileNotFoundError:
+        raise click.ClickException(
+            'No baseline at %s, record one with --update' % baseline)
+    failures = plans.check(expected, current, min_rows)
+    for name in sorted(current):
+        if name not in expected:
+            click.echo('%s: no baseline' % name)
+        for message in failures.get(name, ()):
+            click.echo('%s: %s' % (name, message), err=True)
+    click.echo('%d of %d plans regressed' % (len(failures), len(current)))
+    if failures:
+        sys.exit(1)
+
+
+def init_app(app):
+    app.cli.add_command(roll_show_counters_command)
+    app.cli.add_command(rebuild_show_counters_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(import_shows_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(check_plans_command)
@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
+from flask_sqlalchemy import get_state
+from sqlalchemy import text
+
+# Runs a page's independent queries at the same time instead of one after
+# the other, so its latency is that of the slowest query rather than their
+# sum. Each query runs in a thread of its own with its own app context,
+# hence its own session and pooled connection; the pool needs room for
+# DB_PARALLEL_QUERIES connections per busy request thread. When the request
+# reads from a PostgreSQL snapshot (see replicas.py), the threads' transactions
+# import it, so the queries see the same data as if run one after the other.
+
+_executor = None
+_pid = None
+
+
+def executor():
+    # Created lazily in each process, threads don't survive a fork
+    global _executor, _pid
+    if _executor is None or _pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['DB_PARALLEL_QUERIES'],
+            thread_name_prefix='fyyur-query')
+        _pid = os.getpid()
+    return _executor
+
+
+def export_snapshot(app):
+    # Identifier of the request transaction's snapshot, for other sessions
+    # to import, or None when the request does not read from one
+    if not g.get('db_snapshot'):
+        return None
+    connection = get_state(app).db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return None
+    return connection.execute('SELECT pg_export_snapshot()').scalar()
+
+
+def gather(*functions):
+    # [function() for function in functions], run concurrently when
+    # DB_PARALLEL_QUERIES allows. The functions see a copy of g (the clock,
+    # the replica chosen for the request) and must return plain values, not
+    # instances attached to their session.
+    if current_app.config.get('DB_PARALLEL_QUERIES', 0) < 2 \
+            or len(functions) < 2:
+        return [function() for function in functions]
+
+    app = current_app._get_current_object()
+    state = dict(vars(g))
+    snapshot = export_snapshot(app)
+
+    def call(function):
+        with app.app_context():
+            vars(g).update(state)
+            if snapshot is not None:
+                # Has to be the first statement of the transaction
+                get_state(app).db.session.connection().execute(
+                    text('SET TRANSACTION SNAPSHOT :snapshot'),
+                    snapshot=snapshot)
+            return function()
+
+    futures = [executor().submit(call, function) for function in functions[1:]]
+    # The first one runs here, on the request's own session
+    first = functions[0]()
+    return [first] + [future.result() for future in futures]
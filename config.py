@@ -1,14 +1,134 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
 
-# Connect to the database
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
 
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://abdulaziz@localhost:5432/fyyurapp'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
+def env_list(name):
+    # Comma separated values
+    return [value.strip() for value in os.environ.get(name, '').split(',')
+            if value.strip()]
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Config:
+    # Must be the same in every worker and across restarts, or sessions
+    # (and CSRF tokens) signed by one process are rejected by the next.
+    SECRET_KEY = os.environ.get('SECRET_KEY')
+    DEBUG = False
+    TESTING = False
+
+    # Connect to the database
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'DATABASE_URL', 'postgresql://abdulaziz@localhost:5432/fyyurapp')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read replicas (comma separated URLs) serving the SELECTs of GET
+    # requests. After writing, a user reads from the primary for
+    # DB_STICKY_SECONDS, which should cover the usual replication lag.
+    DATABASE_REPLICA_URLS = env_list('DATABASE_REPLICA_URLS')
+    DB_STICKY_SECONDS = env_int('DB_STICKY_SECONDS', 5)
+    # Threads per worker running a page's independent queries concurrently
+    # (see concurrency.py), 0 to run them one after the other
+    DB_PARALLEL_QUERIES = env_int('DB_PARALLEL_QUERIES', 4)
+
+    # Connection pool of each worker process: up to DB_POOL_SIZE kept open
+    # plus DB_MAX_OVERFLOW opened under load, so a deployment needs up to
+    # workers * (size + overflow) server connections. DB_POOL_TIMEOUT is how
+    # long a request waits for a free connection (seconds), DB_POOL_RECYCLE
+    # the age after which a connection is replaced, and pre-ping checks
+    # connections on checkout so restarts of the server go unnoticed.
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 5)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_PRE_PING = env_bool('DB_POOL_PRE_PING', True)
+    # Queries running longer are cancelled by the server (milliseconds, 0
+    # for none). Only applies to serving requests: connections of flask
+    # commands, migrations included, have no timeout.
+    DB_STATEMENT_TIMEOUT = env_int('DB_STATEMENT_TIMEOUT', 5000)
+    # Behind PgBouncer in transaction pooling mode, PgBouncer does the
+    # pooling: connections are not kept by the workers and no startup
+    # options are sent (set statement_timeout on the database role instead).
+    DB_PGBOUNCER = env_bool('DB_PGBOUNCER', False)
+
+    # Page and format cache: 'memory' (per worker) or 'redis' (shared). The
+    # memory bound only applies to the in-memory backend. Default time to
+    # live is in seconds; pages listing upcoming shows expire earlier, when
+    # the next starts.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_MAX_BYTES = env_int('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    CACHE_TTL = env_int('CACHE_TTL', 300)
+    # Time to live of values read from a replica, which may miss a write
+    # that has just invalidated them
+    CACHE_REPLICA_TTL = env_int('CACHE_REPLICA_TTL', 30)
+    # Listing tiles are keyed on row versions and never invalidated, only
+    # evicted or expired
+    CACHE_FRAGMENT_TTL = env_int('CACHE_FRAGMENT_TTL', 24 * 60 * 60)
+    # With a Redis URL, invalidations are also published to the other workers
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+    # Per request query count, DB, render and total time, logged as JSON
+    # lines and, with SERVER_TIMING, sent in a Server-Timing header (except
+    # for streamed pages, whose headers go out before they render). A
+    # statement run more than N_PLUS_ONE_THRESHOLD times in one request is
+    # flagged as a likely N+1 pattern.
+    INSTRUMENTATION = env_bool('INSTRUMENTATION', True)
+    SERVER_TIMING = env_bool('SERVER_TIMING', True)
+    N_PLUS_ONE_THRESHOLD = env_int('N_PLUS_ONE_THRESHOLD', 5)
+
+    # Compile every template when the app is created, before workers fork
+    TEMPLATE_WARM_UP = env_bool('TEMPLATE_WARM_UP', True)
+
+
+class DevelopmentConfig(Config):
+    # Enable debug mode.
+    DEBUG = True
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'development')
+
+
+class TestingConfig(Config):
+    TESTING = True
+    SECRET_KEY = 'testing'
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'TEST_DATABASE_URL', 'postgresql://abdulaziz@localhost:5432/fyyurapp_test')
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 2)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 0)
+    CACHE_BACKEND = 'memory'
+    CACHE_REDIS_URL = None
+    DB_PARALLEL_QUERIES = env_int('DB_PARALLEL_QUERIES', 0)
+    DATABASE_REPLICA_URLS = env_list('TEST_DATABASE_REPLICA_URLS')
+
+
+class ProductionConfig(Config):
+    # SECRET_KEY and the database have no default here, setup_db() refuses
+    # to start without them
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # Timings are only for clients that are told to ask for them
+    SERVER_TIMING = env_bool('SERVER_TIMING', False)
+
+
+configs = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+
+def from_env():
+    # Config class named by FYYUR_ENV, development by default
+    name = os.environ.get('FYYUR_ENV', 'development')
+    if name not in configs:
+        raise ValueError('FYYUR_ENV must be one of %s, not %r'
+                         % (', '.join(configs), name))
+    return configs[name]
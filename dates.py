@@ -0,0 +1,94 @@
+import datetime
+import threading
+from collections import OrderedDict
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+
+# Date formatting for the templates. Babel parses the pattern and the locale
+# on every format_datetime() call; here they are parsed once per (format,
+# locale), and formatted strings are kept in a bounded LRU, since listings
+# and detail pages show the same start times over and over.
+
+# Named formats of the datetime filter; any other format is a Babel pattern
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+LOCALE = 'en'
+MAX_RESULTS = 10000
+
+_patterns = {}
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+def pattern(format, locale=LOCALE):
+    # (compiled pattern, parsed locale) for a named format or Babel pattern
+    key = (format, locale)
+    compiled = _patterns.get(key)
+    if compiled is None:
+        compiled = _patterns[key] = (
+            parse_pattern(FORMATS.get(format, format)), Locale.parse(locale))
+    return compiled
+
+
+def _key(value, format, locale):
+    # Strings only come from callers that did not parse the date themselves.
+    # Naive datetimes are taken as UTC, as Babel does. The UTC offset is part
+    # of the key: aware datetimes at the same instant compare equal however
+    # different their local times are.
+    if not isinstance(value, datetime.datetime):
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value, value.utcoffset(), format, locale
+
+
+def _format(key):
+    value, offset, format, locale = key
+    compiled, parsed_locale = pattern(format, locale)
+    return compiled.apply(value, parsed_locale)
+
+
+def _remember(formatted):
+    # Adds {key: string} to the LRU, dropping the least recently used
+    with _lock:
+        _results.update(formatted)
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+
+
+def format_datetime(value, format='medium', locale=LOCALE):
+    key = _key(value, format, locale)
+    with _lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            return result
+    result = _format(key)
+    _remember({key: result})
+    return result
+
+
+def format_many(values, format='medium', locale=LOCALE):
+    # [string] for a whole list of dates, with a single pass over the LRU
+    keys = [_key(value, format, locale) for value in values]
+    results = []
+    with _lock:
+        for key in keys:
+            result = _results.get(key)
+            if result is not None:
+                _results.move_to_end(key)
+            results.append(result)
+    missing = {key: _format(key) for key, result in zip(keys, results)
+               if result is None}
+    if missing:
+        _remember(missing)
+    return [result if result is not None else missing[key]
+            for key, result in zip(keys, results)]
+
+
+def clear():
+    with _lock:
+        _results.clear()
@@ -0,0 +1,56 @@
+import csv
+import datetime
+import io
+import json
+from models import db
+
+FORMATS = ('csv', 'ndjson')
+# Rows fetched per round trip from the server-side cursor, and per chunk sent
+CHUNK_SIZE = 1000
+
+
+def to_csv(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def to_json(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(model, format):
+    # Yields the model's export_fields for every row, in chunks of text.
+    # Only plain column tuples are fetched, through a server-side cursor
+    # (yield_per), so memory stays flat however large the table is.
+    fields = model.export_fields
+    rows = db.session.query(*[getattr(model, name) for name in fields])\
+        .order_by(model.id)\
+        .yield_per(CHUNK_SIZE)
+
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+    count = 0
+    for row in rows:
+        if format == 'csv':
+            writer.writerow([to_csv(value) for value in row])
+        else:
+            buffer.write(json.dumps(
+                {name: to_json(value) for name, value in zip(fields, row)}))
+            buffer.write('\n')
+        count += 1
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
@@ -4,12 +4,28 @@ from fabric.contrib.console import confirm
 # prepare for deployment
 
 
+def baseline():
+    # Route benchmark results the next benchmark() runs are compared with,
+    # taken on a database seeded with `flask seed`
+    local("python benchmarks/routes.py run --read-only --output benchmarks/baseline.json")
+
+
 def test():
+    with settings(warn_only=True):
+        result = local("python -m pytest -q tests", capture=True)
+    if result.failed and not confirm("Tests failed. Continue?"):
+        abort("Aborted at user request.")
+    benchmark()
+
+
+def benchmark():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python benchmarks/routes.py run --read-only --output benchmarks/latest.json"
+            " && python benchmarks/routes.py compare benchmarks/baseline.json benchmarks/latest.json",
+            capture=True
         )
-    if result.failed and not confirm("Tests failed. Continue?"):
+    if result.failed and not confirm("Benchmarks regressed. Continue?"):
         abort("Aborted at user request.")
 
 
@@ -39,8 +55,9 @@ def heroku():
 
 
 def heroku_test():
+    # Smoke test: every read-only route answers
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python benchmarks/routes.py run --read-only --requests 5 --concurrency 1"
     )
 
 
@@ -0,0 +1,68 @@
+import hashlib
+import itertools
+from flask import current_app
+from markupsafe import Markup
+import cache
+import metrics
+
+# Listing pages are assembled from the cached HTML of their tiles (one per
+# venue, artist or show). A tile's key holds the versions of the rows it
+# shows, so a write never has to invalidate tiles: the new version simply
+# misses, and stale tiles age out of the cache. The key also holds a hash
+# of the tile template, for caches shared across deploys.
+#
+# Tile templates are rendered with only the row in their context (no
+# request, url_for or other context processors).
+
+# Rows whose tiles are looked up in the cache at once by render_stream()
+BATCH_SIZE = 200
+
+_fingerprints = {}
+
+
+def fingerprint(template_name):
+    if template_name not in _fingerprints:
+        env = current_app.jinja_env
+        source, filename, uptodate = env.loader.get_source(env, template_name)
+        _fingerprints[template_name] = hashlib.sha1(
+            source.encode()).hexdigest()[:12]
+    return _fingerprints[template_name]
+
+
+def render_each(template_name, name, rows, keys):
+    # [Markup] of the template rendered for each row (as `name`), cached
+    # under ('fragment', template_name, fingerprint, *key) for each key
+    keys = [('fragment', template_name, fingerprint(template_name)) +
+            tuple(key) for key in keys]
+    ttl = current_app.config.get('CACHE_FRAGMENT_TTL', 86400)
+    template = None
+    fragments = []
+    for row, key, html in zip(rows, keys, cache.backend.get_many(keys)):
+        metrics.cache_lookup('fragment', html is not None)
+        if html is None:
+            if template is None:
+                template = current_app.jinja_env.get_template(template_name)
+            html = template.render({name: row})
+            cache.backend.set(key, html, ttl=ttl)
+        fragments.append(Markup(html))
+    return fragments
+
+
+def render_stream(template_name, name, pairs, batch_size=BATCH_SIZE):
+    # Like render_each(), for an iterable of (row, key) of any length:
+    # yields the Markup of each row, batch_size rows at a time
+    pairs = iter(pairs)
+    while True:
+        batch = list(itertools.islice(pairs, batch_size))
+        if not batch:
+            return
+        yield from render_each(template_name, name,
+                               [row for row, key in batch],
+                               [key for row, key in batch])
+
+
+def warm_up(app):
+    # Compiles every template once, e.g. in the gunicorn master before it
+    # forks, so that no request pays for it
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
@@ -0,0 +1,62 @@
+# gunicorn settings, read from the working directory by a plain `gunicorn`
+# (see Procfile). Every value can be overridden from the environment.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+wsgi_app = 'wsgi:create_app()'
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+# The app is imported once in the master and forked into the workers, which
+# start faster and share its memory. Code changes then need a new master:
+# `kill -USR2` the master, then `kill -WINCH` and `kill -QUIT` the old one.
+preload_app = True
+
+# Threaded workers: requests mostly wait on the database. Each worker keeps
+# one pooled connection per thread (DB_POOL_SIZE); the concurrent page
+# queries (DB_PARALLEL_QUERIES) use the pool overflow.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+# Workers are replaced after a while, so leaks can't build up; the jitter
+# keeps them from all restarting at once. In-flight requests get
+# graceful_timeout seconds to finish on a restart or shutdown.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max(max_requests // 10, 1)
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+
+# Each worker writes its metrics to files here, /metrics adds them up
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-metrics'))
+os.makedirs(metrics_dir, exist_ok=True)
+
+
+def on_starting(server):
+    # Samples left by the workers of a previous run
+    current = '_%d.db' % os.getpid()
+    for name in glob.glob(os.path.join(metrics_dir, '*.db')):
+        if not name.endswith(current):
+            os.remove(name)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # Connections and threads of the master must not be shared by workers:
+    # drop the inherited pooled connections and restart the cache's Redis
+    # client and invalidation subscriber in this process.
+    from models import dispose_engines
+    import cache
+    app = server.app.wsgi()
+    dispose_engines(app)
+    cache.init_app(app)
@@ -0,0 +1,268 @@
+import codecs
+import csv
+import datetime
+import json
+import dateutil.parser
+from sqlalchemy.dialects import postgresql
+import cache
+import search
+from models import (Artist, Show, Venue, db, natural_key_index,
+                    recount_show_counters)
+
+FORMATS = ('csv', 'ndjson', 'json')
+BATCH_SIZE = 1000
+# Errors listed in a report; the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+class ImportReport:
+
+    def __init__(self):
+        # Records written, whether new or already present
+        self.loaded = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, record, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"record": record, "error": message})
+
+    def format(self):
+        return {
+            "loaded": self.loaded,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def read_records(stream, format):
+    # Yields one dict per record of a binary stream, without loading the
+    # whole input: 'csv' with a header row, or 'ndjson'. A 'json' array has
+    # to be parsed in one go and is only meant for small uploads.
+    if format == 'json':
+        yield from json.load(codecs.getreader('utf-8')(stream))
+        return
+    lines = codecs.iterdecode(stream, 'utf-8')
+    if format == 'csv':
+        yield from csv.DictReader(lines)
+    elif format == 'ndjson':
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    # Only this record is lost, the next line is readable
+                    yield InvalidRecord(e)
+    else:
+        raise ValueError('Unsupported format: %s' % format)
+
+
+def guess_format(filename, content_type=None):
+    for format in FORMATS:
+        if filename and filename.lower().endswith('.' + format):
+            return format
+        if content_type and format in content_type:
+            return format
+    return 'csv'
+
+
+def parse_start_time(value):
+    if isinstance(value, datetime.datetime):
+        start_time = value
+    else:
+        try:
+            start_time = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            start_time = dateutil.parser.parse(value)
+    if start_time.tzinfo is None:
+        start_time = start_time.replace(tzinfo=datetime.timezone.utc)
+    return start_time
+
+
+def coerce(column, value):
+    # A CSV/JSON field as a value for column; CSV holds genres as "a;b"
+    # Variant types (see models.timestamptz()) are checked by their default
+    type = getattr(column.type, 'impl', column.type)
+    if isinstance(type, db.Boolean):
+        if value is None or value == '':
+            return False
+        if isinstance(value, bool):
+            return value
+        if str(value).strip().lower() in ('1', 'true', 'yes', 't', 'y'):
+            return True
+        if str(value).strip().lower() in ('0', 'false', 'no', 'f', 'n'):
+            return False
+        raise ValueError('%s is not a boolean' % value)
+    if value is None or value == '':
+        return None
+    if isinstance(type, db.ARRAY):
+        if isinstance(value, list):
+            return value
+        return [part.strip() for part in value.split(';') if part.strip()]
+    if isinstance(type, db.Integer):
+        return int(value)
+    if isinstance(type, db.DateTime):
+        return parse_start_time(value)
+    return str(value)
+
+
+def insert_statement(model, upsert=False):
+    # INSERT that skips, or with upsert updates, rows whose natural key
+    # already exists. ON CONFLICT needs PostgreSQL; on SQLite (test runs)
+    # rows are skipped with INSERT OR IGNORE, and upserts are plain INSERTs.
+    table = model.__table__
+    if db.session.bind.dialect.name != 'postgresql':
+        if not upsert:
+            return table.insert().prefix_with('OR IGNORE', dialect='sqlite')
+        return table.insert()
+    statement = postgresql.insert(table)
+    if not upsert:
+        return statement.on_conflict_do_nothing(
+            index_elements=natural_key_index(model))
+    return statement.on_conflict_do_update(
+        index_elements=natural_key_index(model),
+        set_=dict({name: statement.excluded[name]
+                   for name in model.export_fields
+                   if name != 'id' and name not in model.natural_key},
+                  version=table.c.version + 1))
+
+
+def import_catalogue(model, records, batch_size=BATCH_SIZE):
+    # Upserts venues or artists on their natural key (name, city, state),
+    # batch by batch. Ids in the input are ignored.
+    report = ImportReport()
+    columns = [model.__table__.c[name]
+               for name in model.export_fields if name != 'id']
+    statement = insert_statement(model, upsert=True)
+
+    def key(row):
+        # As the natural key index compares rows, None being ''
+        return tuple('' if row[name] is None else row[name]
+                     for name in model.natural_key)
+
+    batch = []
+    number = 0
+    try:
+        for number, record in enumerate(records, 1):
+            if isinstance(record, InvalidRecord):
+                report.error(number, 'Invalid record: %s' % record)
+                continue
+            try:
+                row = {column.name: coerce(column, record.get(column.name))
+                       for column in columns}
+            except AttributeError:
+                report.error(number, 'Invalid record: not an object')
+                continue
+            except (TypeError, ValueError, OverflowError) as e:
+                report.error(number, 'Invalid value: %s' % e)
+                continue
+            if not row['name']:
+                report.error(number, 'Missing field name')
+                continue
+
+            batch.append((number, row))
+            if len(batch) >= batch_size:
+                write_batch(statement, batch, report, key=key)
+                batch = []
+    except (ValueError, csv.Error) as e:
+        report.error(number + 1, 'Unreadable input: %s' % e)
+    write_batch(statement, batch, report, key=key)
+
+    # Any row may have changed, including names shown on other pages
+    search.invalidate(model)
+    cache.clear()
+    return report
+
+
+def write_batch(statement, batch, report, after=None, key=None):
+    # One executemany statement for the batch, plus whatever after(rows)
+    # does in the same transaction. A failure rejects the whole batch.
+    # ON CONFLICT DO UPDATE cannot change a row twice in one statement: of
+    # the records with the same key(row), only the last one is written, as
+    # if it had overwritten the others.
+    if not batch:
+        return
+    rows = [row for number, row in batch]
+    if key is not None:
+        rows = list({key(row): row for row in rows}.values())
+    try:
+        db.session.execute(statement, rows)
+        if after is not None:
+            after(rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for number, row in batch:
+            report.error(number, 'Batch failed: %s' % getattr(e, 'orig', e))
+        return
+    report.loaded += len(batch)
+
+
+def import_shows(records, batch_size=BATCH_SIZE):
+    # Validates each record against the preloaded artist and venue ids and
+    # inserts the valid ones batch by batch; a bad record is reported and
+    # skipped without failing the rest of its batch. Loading the same
+    # shows twice is harmless.
+    report = ImportReport()
+    artist_ids = {id for id, in db.session.query(Artist.id)}
+    venue_ids = {id for id, in db.session.query(Venue.id)}
+
+    batch = []
+    number = 0
+    try:
+        for number, record in enumerate(records, 1):
+            if isinstance(record, InvalidRecord):
+                report.error(number, 'Invalid record: %s' % record)
+                continue
+            try:
+                artist_id = int(record['artist_id'])
+                venue_id = int(record['venue_id'])
+                start_time = parse_start_time(record['start_time'])
+            except KeyError as e:
+                report.error(number, 'Missing field %s' % e)
+                continue
+            except (TypeError, ValueError, OverflowError) as e:
+                report.error(number, 'Invalid value: %s' % e)
+                continue
+            if artist_id not in artist_ids:
+                report.error(number, "Artist %d doesn't exist" % artist_id)
+                continue
+            if venue_id not in venue_ids:
+                report.error(number, "Venue %d doesn't exist" % venue_id)
+                continue
+
+            batch.append((number, {
+                "artist_id": artist_id,
+                "venue_id": venue_id,
+                "start_time": start_time,
+            }))
+            if len(batch) >= batch_size:
+                insert_batch(batch, report)
+                batch = []
+    except (ValueError, csv.Error) as e:
+        # The input itself is unreadable from here on
+        report.error(number + 1, 'Unreadable input: %s' % e)
+    insert_batch(batch, report)
+    return report
+
+
+def insert_batch(batch, report):
+    # Shows already present (same venue, artist and start time) are skipped;
+    # the counters of every venue and artist in the batch are recounted.
+    venue_ids = set()
+    artist_ids = set()
+
+    def recount(rows):
+        venue_ids.update(row["venue_id"] for row in rows)
+        artist_ids.update(row["artist_id"] for row in rows)
+        recount_show_counters(Venue, Show.venue_id, venue_ids)
+        recount_show_counters(Artist, Show.artist_id, artist_ids)
+
+    write_batch(insert_statement(Show), batch, report, after=recount)
+    cache.invalidate(*[('venue', id) for id in venue_ids],
+                     *[('artist', id) for id in artist_ids])
@@ -0,0 +1,196 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, has_app_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per request: the number of SQL statements and the time spent in them,
+# template render time, total time and response size. They are sent back in
+# a Server-Timing header and logged as one JSON line per request to the
+# 'fyyur.requests' logger, along with the statements repeated more than
+# N_PLUS_ONE_THRESHOLD times (the signature of an N+1 query pattern).
+# Streamed responses are rendered after their headers are sent: they get no
+# Server-Timing header, and are logged once their body has been sent.
+
+logger = logging.getLogger('fyyur.requests')
+
+# Bind parameter lists vary in length with the values bound, not the query
+IN_LIST = re.compile(r'\bIN \([^()]*\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    return IN_LIST.sub('IN (...)', WHITESPACE.sub(' ', statement)).strip()
+
+
+class RequestStats:
+    # Shared with the threads running a request's concurrent queries (see
+    # concurrency.gather(), which copies g), hence the lock
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        # Nesting depth of the template renders in progress
+        self.rendering = 0
+        self.statements = Counter()
+        self.lock = threading.Lock()
+
+    def query(self, statement, duration):
+        with self.lock:
+            self.queries += 1
+            self.db_time += duration
+            self.statements[statement_shape(statement)] += 1
+
+    def start_render(self):
+        # Render time excludes the queries run while rendering, and a render
+        # nested in another (e.g. the fragments of a streamed page) is
+        # already timed by the outer one
+        self.rendering += 1
+        return time.perf_counter(), self.db_time
+
+    def end_render(self, started):
+        self.rendering -= 1
+        if self.rendering:
+            return
+        start, db_time = started
+        with self.lock:
+            # Concurrent queries (see concurrency.gather()) may add up to
+            # more than the time they were waited for
+            self.render_time += max(
+                time.perf_counter() - start - (self.db_time - db_time), 0)
+
+    def repeated(self, threshold):
+        # Statements run more than threshold times, most repeated first
+        return [(statement, count)
+                for statement, count in self.statements.most_common()
+                if count > threshold]
+
+
+def current_stats():
+    return g.get('request_stats') if has_app_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    started = conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.query(statement, time.perf_counter() - started)
+
+
+class TimedTemplate(Template):
+    # Records the time spent rendering each top level template
+
+    def render(self, *args, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return Template.render(self, *args, **kwargs)
+        started = stats.start_render()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            stats.end_render(started)
+
+    def generate(self, *args, **kwargs):
+        # Streamed rendering: the time spent producing each piece, not the
+        # time the server takes to send it
+        stats = current_stats()
+        pieces = Template.generate(self, *args, **kwargs)
+        if stats is None:
+            yield from pieces
+            return
+        while True:
+            started = stats.start_render()
+            try:
+                piece = next(pieces)
+            except StopIteration:
+                return
+            finally:
+                stats.end_render(started)
+            yield piece
+
+
+def server_timing(stats, total):
+    return ', '.join([
+        'db;dur=%.1f;desc="%d queries"' % (stats.db_time * 1000, stats.queries),
+        'render;dur=%.1f' % (stats.render_time * 1000),
+        'total;dur=%.1f' % (total * 1000),
+    ])
+
+
+def init_app(app):
+    if not app.config.get('INSTRUMENTATION', True):
+        return
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+
+    if not event.contains(Engine, 'before_cursor_execute',
+                          before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    app.jinja_env.template_class = TimedTemplate
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def start_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def report_stats(response):
+        if response.is_streamed:
+            # The template renders, and runs its queries, as the body is
+            # sent: g keeps the stats until then
+            stats = g.get('request_stats')
+        else:
+            stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": response.status_code,
+        }
+        if response.is_streamed:
+            response.call_on_close(lambda: log_request(
+                stats, record, time.perf_counter() - stats.started, None))
+            return response
+
+        total = time.perf_counter() - stats.started
+        if app.config.get('SERVER_TIMING', True):
+            response.headers['Server-Timing'] = server_timing(stats, total)
+        log_request(stats, record, total, response.calculate_content_length())
+        return response
+
+    def log_request(stats, record, total, size):
+        # size is None for streamed responses, whose length is only known
+        # once sent (calculate_content_length() would buffer them)
+        repeated = stats.repeated(threshold)
+        record.update({
+            "duration_ms": round(total * 1000, 2),
+            "queries": stats.queries,
+            "db_ms": round(stats.db_time * 1000, 2),
+            "render_ms": round(stats.render_time * 1000, 2),
+            "size": size,
+        })
+        if repeated:
+            record["n_plus_one"] = [{"statement": statement, "count": count}
+                                    for statement, count in repeated]
+        logger.log(logging.WARNING if repeated else logging.INFO,
+                   json.dumps(record))
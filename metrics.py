@@ -0,0 +1,90 @@
+import os
+import time
+from flask import Response, current_app, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from sqlalchemy.pool import QueuePool
+
+# Prometheus metrics, served at /metrics. Under gunicorn every worker writes
+# its samples to files in PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py)
+# and /metrics adds up those of all workers; without it, the process' own
+# registry is served.
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    'fyyur_request_duration_seconds', 'Time to handle a request',
+    ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'fyyur_requests_total', 'Requests handled',
+    ['endpoint', 'method', 'status'])
+POOL_WAIT = Histogram(
+    'fyyur_db_pool_wait_seconds',
+    'Time to get a connection from the pool, including opening new ones',
+    buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+CACHE_LOOKUPS = Counter(
+    'fyyur_cache_lookups_total', 'Page and format cache lookups',
+    ['variant', 'result'])
+FORM_FAILURES = Counter(
+    'fyyur_form_failures_total', 'Form submissions that failed', ['form'])
+
+
+class TimedQueuePool(QueuePool):
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return QueuePool._do_get(self)
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+def cache_lookup(variant, hit):
+    CACHE_LOOKUPS.labels(variant, 'hit' if hit else 'miss').inc()
+
+
+def form_failed(form):
+    # Counts a failed submission of form and logs the exception being handled
+    FORM_FAILURES.labels(form).inc()
+    current_app.logger.exception('Submission of the %s form failed', form)
+
+
+def registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def metrics():
+    return Response(generate_latest(registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        method = request.method
+
+        def observe():
+            REQUEST_LATENCY.labels(endpoint, method)\
+                .observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint, method, response.status_code).inc()
+
+        if response.is_streamed:
+            # Observed once the body, rendered as it is sent, has been sent
+            response.call_on_close(observe)
+        else:
+            observe()
+        return response
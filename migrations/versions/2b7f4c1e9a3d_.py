@@ -0,0 +1,47 @@
+"""store Show.start_time as timestamptz and index it per venue/artist
+
+Revision ID: 2b7f4c1e9a3d
+Revises: 618d81c8dba7
+Create Date: 2021-07-02 18:41:12.503617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7f4c1e9a3d'
+down_revision = '618d81c8dba7'
+branch_labels = None
+depends_on = None
+
+
+# A time of day followed by a UTC offset, e.g. '2019-05-21T21:30:00.000Z'
+WITH_OFFSET = r'[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?\s*(Z|[+-]\d{2}(:?\d{2})?)$'
+
+
+def upgrade():
+    # Existing rows hold ISO 8601 strings written by the show form or the
+    # seed data. Those without an offset are UTC, as the app takes naive
+    # times (Show.validate_start_time), whatever the server's TimeZone.
+    op.alter_column('Show', 'start_time',
+                    existing_type=sa.String(),
+                    type_=sa.DateTime(timezone=True),
+                    postgresql_using="CASE WHEN start_time ~ '%s' "
+                    "THEN start_time::timestamptz "
+                    "ELSE start_time::timestamp AT TIME ZONE 'UTC' END"
+                    % WITH_OFFSET)
+    op.create_index('ix_Show_venue_id_start_time', 'Show',
+                    ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_artist_id_start_time', 'Show',
+                    ['artist_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_Show_venue_id_start_time', table_name='Show')
+    op.alter_column('Show', 'start_time',
+                    existing_type=sa.DateTime(timezone=True),
+                    type_=sa.String(),
+                    # Naive UTC text, as the show form wrote it
+                    postgresql_using="(start_time AT TIME ZONE 'UTC')::text")
@@ -0,0 +1,34 @@
+"""pg_trgm indexes for venue and artist search
+
+Revision ID: 4c9a81f2d6e7
+Revises: 7d1e0b6c52fa
+Create Date: 2021-07-08 14:02:37.664190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c9a81f2d6e7'
+down_revision = '7d1e0b6c52fa'
+branch_labels = None
+depends_on = None
+
+# Must match search.location()
+LOCATION = "(coalesce(city, '') || ', ' || coalesce(state, ''))"
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute('CREATE INDEX "ix_%s_name_trgm" ON "%s" '
+                   'USING gin (name gin_trgm_ops)' % (table, table))
+        op.execute('CREATE INDEX "ix_%s_location_trgm" ON "%s" '
+                   'USING gin (%s gin_trgm_ops)' % (table, table, LOCATION))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.execute('DROP INDEX "ix_%s_location_trgm"' % table)
+        op.execute('DROP INDEX "ix_%s_name_trgm"' % table)
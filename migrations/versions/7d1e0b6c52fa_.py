@@ -0,0 +1,27 @@
+"""indexes backing the paginated /shows listing
+
+Revision ID: 7d1e0b6c52fa
+Revises: 2b7f4c1e9a3d
+Create Date: 2021-07-05 11:16:48.208133
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d1e0b6c52fa'
+down_revision = '2b7f4c1e9a3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Show_start_time_id', 'Show',
+                    ['start_time', 'id'], unique=False)
+    op.create_index(op.f('ix_Venue_city'), 'Venue', ['city'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Venue_city'), table_name='Venue')
+    op.drop_index('ix_Show_start_time_id', table_name='Show')
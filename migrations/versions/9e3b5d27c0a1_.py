@@ -0,0 +1,53 @@
+"""materialized upcoming/past show counters on Venue and Artist
+
+Revision ID: 9e3b5d27c0a1
+Revises: 4c9a81f2d6e7
+Create Date: 2021-07-12 09:27:55.118402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b5d27c0a1'
+down_revision = '4c9a81f2d6e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_show_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+        op.add_column(table, sa.Column('past_show_count', sa.Integer(),
+                                       nullable=False, server_default='0'))
+    op.create_table('ShowCounterState',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('rolled_at', sa.DateTime(timezone=True),
+                              nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+
+    # Backfill the counters as of now
+    op.execute('INSERT INTO "ShowCounterState" (id, rolled_at) VALUES (1, now())')
+    for table, column in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute('''
+            UPDATE "{table}" SET
+                upcoming_show_count = counts.upcoming,
+                past_show_count = counts.past
+            FROM (
+                SELECT {column} AS id,
+                       count(*) FILTER (WHERE start_time >= now()) AS upcoming,
+                       count(*) FILTER (WHERE start_time < now()) AS past
+                FROM "Show" GROUP BY {column}
+            ) AS counts
+            WHERE "{table}".id = counts.id
+        '''.format(table=table, column=column))
+
+
+def downgrade():
+    op.drop_table('ShowCounterState')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_show_count')
+        op.drop_column(table, 'upcoming_show_count')
@@ -0,0 +1,91 @@
+"""natural key unique indexes for bulk upserts
+
+Revision ID: b5f2e8a4d913
+Revises: 9e3b5d27c0a1
+Create Date: 2021-07-15 16:45:03.770214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f2e8a4d913'
+down_revision = '9e3b5d27c0a1'
+branch_labels = None
+depends_on = None
+
+
+# Natural keys as models.natural_key_index() defines them: NULLs never
+# conflict in a unique index, so text columns are compared through coalesce()
+CATALOGUE_KEY = "coalesce(name, ''), coalesce(city, ''), coalesce(state, '')"
+SHOW_KEY = 'venue_id, artist_id, start_time'
+
+
+def merge_duplicates(table, show_column):
+    # Keeps the oldest of the venues (or artists) sharing a natural key,
+    # moves the shows of the others to it and deletes them
+    duplicates = """
+        (SELECT id, min(id) OVER (PARTITION BY {key}) AS kept_id
+         FROM "{table}") AS duplicates
+    """.format(key=CATALOGUE_KEY, table=table)
+    op.execute("""
+        UPDATE "Show" SET {column} = duplicates.kept_id FROM {duplicates}
+        WHERE "Show".{column} = duplicates.id
+          AND duplicates.id <> duplicates.kept_id
+    """.format(column=show_column, duplicates=duplicates))
+    op.execute("""
+        DELETE FROM "{table}" USING {duplicates}
+        WHERE "{table}".id = duplicates.id
+          AND duplicates.id <> duplicates.kept_id
+    """.format(table=table, duplicates=duplicates))
+
+
+def recount_shows(table, show_column):
+    # Counters of 9e3b5d27c0a1, against the current watermark
+    op.execute("""
+        UPDATE "{table}" SET
+            upcoming_show_count = coalesce(counts.upcoming, 0),
+            past_show_count = coalesce(counts.past, 0)
+        FROM "{table}" AS rows
+        LEFT JOIN (
+            SELECT {column} AS id,
+                   count(*) FILTER (WHERE start_time >= state.rolled_at)
+                       AS upcoming,
+                   count(*) FILTER (WHERE start_time < state.rolled_at)
+                       AS past
+            FROM "Show", "ShowCounterState" AS state
+            GROUP BY {column}
+        ) AS counts ON counts.id = rows.id
+        WHERE "{table}".id = rows.id
+    """.format(table=table, column=show_column))
+
+
+def upgrade():
+    # Rows loaded twice before there was a unique key are merged first; this
+    # cannot be undone by downgrade()
+    merge_duplicates('Venue', 'venue_id')
+    merge_duplicates('Artist', 'artist_id')
+    # Including the shows that merging made identical
+    op.execute("""
+        DELETE FROM "Show" USING (
+            SELECT id, row_number() OVER (PARTITION BY {key} ORDER BY id) AS n
+            FROM "Show"
+        ) AS duplicates
+        WHERE "Show".id = duplicates.id AND duplicates.n > 1
+    """.format(key=SHOW_KEY))
+    recount_shows('Venue', 'venue_id')
+    recount_shows('Artist', 'artist_id')
+
+    for table in ('Venue', 'Artist'):
+        op.execute('CREATE UNIQUE INDEX "ux_{table}_natural_key" '
+                   'ON "{table}" ({key})'.format(table=table,
+                                                 key=CATALOGUE_KEY))
+    op.create_index('ux_Show_natural_key', 'Show',
+                    ['venue_id', 'artist_id', 'start_time'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_Show_natural_key', table_name='Show')
+    op.drop_index('ux_Artist_natural_key', table_name='Artist')
+    op.drop_index('ux_Venue_natural_key', table_name='Venue')
@@ -0,0 +1,27 @@
+"""row versions for API ETags
+
+Revision ID: c7a0d9e1f254
+Revises: b5f2e8a4d913
+Create Date: 2021-07-19 10:12:41.350926
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a0d9e1f254'
+down_revision = 'b5f2e8a4d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('version', sa.Integer(),
+                                       nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_column(table, 'version')
@@ -1,99 +1,286 @@
+import click
+from flask.cli import ScriptInfo
 from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
-import datetime
+from sqlalchemy import case, event, func, or_
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool
 from flask_moment import Moment
+import datetime
+import cache
+import clock
+import config
+import metrics
+import replicas
+import search
+
+
+db = replicas.RoutingSQLAlchemy()
+
+
+class UTCDateTime(db.TypeDecorator):
+    # SQLite keeps no time zone: aware datetimes are stored as naive UTC and
+    # read back as aware UTC ones, as from a PostgreSQL timestamptz
+    impl = db.DateTime
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value
+
+
+# Column types of the PostgreSQL schema, with stand-ins on SQLite so that the
+# test suite can run on it
 
+def timestamptz():
+    return db.DateTime(timezone=True).with_variant(UTCDateTime(), 'sqlite')
 
-db = SQLAlchemy()
-current_datetime = datetime.datetime.now().isoformat()
 
+def string_array():
+    return db.ARRAY(db.String(120)).with_variant(db.JSON(), 'sqlite')
 
-def setup_db(app):
+
+def setup_db(app, config_object=None):
     moment = Moment(app)
-    app.config.from_object('config')
+    app.config.from_object(config_object or config.from_env())
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError('SECRET_KEY must be set')
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        raise RuntimeError('DATABASE_URL must be set')
+    if cli_command() is not None:
+        # Migrations, bulk loads and counter rebuilds may rightly run for
+        # longer than any query of a page
+        app.config['DB_STATEMENT_TIMEOUT'] = 0
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                          engine_options(app.config))
+    replicas.configure(app)
     db.init_app(app)
+    replicas.init_app(app)
     Migrate(app, db)
 
 
+def cli_command():
+    # Name of the flask command the app is being loaded for (e.g. 'upgrade'
+    # of flask db upgrade), None when it is loaded to serve requests: by
+    # gunicorn, uvicorn or flask run
+    context = click.get_current_context(silent=True)
+    if context is None or context.find_object(ScriptInfo) is None \
+            or context.command.name == 'run':
+        return None
+    return context.command.name
+
+
+def dispose_engines(app):
+    # Closes the pooled connections of the primary and replica engines, e.g.
+    # those a forked worker inherited from its parent
+    for bind in [None] + list(app.config['SQLALCHEMY_BINDS'] or ()):
+        db.get_engine(app, bind=bind).dispose()
+
+
+def engine_options(settings):
+    # create_engine() arguments from the DB_* settings, see config.py
+    if make_url(settings['SQLALCHEMY_DATABASE_URI']).get_backend_name() \
+            != 'postgresql':
+        # e.g. SQLite test runs, which use SQLAlchemy's default pools
+        return {}
+    if settings['DB_PGBOUNCER']:
+        return {'poolclass': NullPool}
+
+    options = {
+        # A QueuePool reporting how long checkouts wait
+        'poolclass': metrics.TimedQueuePool,
+        'pool_size': settings['DB_POOL_SIZE'],
+        'max_overflow': settings['DB_MAX_OVERFLOW'],
+        'pool_timeout': settings['DB_POOL_TIMEOUT'],
+        'pool_recycle': settings['DB_POOL_RECYCLE'],
+        'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+    }
+    if settings['DB_STATEMENT_TIMEOUT']:
+        options['connect_args'] = {
+            'options': '-c statement_timeout=%d' % settings['DB_STATEMENT_TIMEOUT'],
+        }
+    return options
+
+
+def next_show_start(details):
+    # When a details record goes stale: its next upcoming show starts
+    if details['upcoming_shows']:
+        return details['upcoming_shows'][0]['start_time']
+    return None
+
+
+def search_query(model, search_term, limit):
+    # PostgreSQL search: (id, name, upcoming_show_count, total match count)
+    # for one page of matches, ranked
+    place = search.location(model)
+    pattern = search.like_pattern(search_term)
+    prefix = case([(model.name.ilike(
+        search.like_pattern(search_term, prefix=True)), 0)], else_=1)
+    relevance = func.greatest(func.similarity(model.name, search_term),
+                              func.similarity(place, search_term))
+    return db.session.query(model.id, model.name, model.upcoming_show_count,
+                            func.count().over())\
+        .filter(or_(model.name.ilike(pattern), place.ilike(pattern)))\
+        .order_by(prefix, relevance.desc(), model.name, model.id)\
+        .limit(limit)
+
+
+def natural_key_index(model):
+    # Expressions of the model's unique natural key index, as ON CONFLICT
+    # has to name them. NULLs never conflict in a unique index, so text
+    # columns are indexed as coalesce(column, ''): a venue without a state
+    # still matches itself on the next import. The '' is inlined, not bound,
+    # for the ON CONFLICT target to read the same as the index.
+    columns = [model.__table__.c[name] for name in model.natural_key]
+    return [func.coalesce(column, db.literal_column("''"))
+            if isinstance(column.type, db.String) else column
+            for column in columns]
+
+
+def exists(model, id):
+    # Whether a row with this id exists, without loading it
+    return exists_query(model, id).scalar()
+
+
+def exists_query(model, id):
+    return db.session.query(db.exists().where(model.id == id))
+
+
+def search_format(model, search_term, limit):
+    # Total match count and one ranked page of matching names or "City, ST"
+    # locations, with their upcoming show counts. On PostgreSQL this is a
+    # single statement served by the pg_trgm indexes; other databases pick
+    # the page from the in-memory fallback index.
+    search_term = search_term.strip()
+    query = db.session.query(model.id, model.name, model.upcoming_show_count)
+
+    if db.session.bind.dialect.name != 'postgresql':
+        ids = search.fallback_index(model, db.session).match(search_term)
+        page = ids[:limit]
+        rows = {}
+        if page:
+            rows = {row[0]: row for row in query.filter(model.id.in_(page))}
+        count = len(ids)
+        rows = [rows[id] for id in page]
+    else:
+        rows = search_query(model, search_term, limit).all()
+        count = rows[0][3] if rows else 0
+
+    return {
+        "count": count,
+        "data": [{
+            "id": row[0],
+            "name": row[1],
+            "num_upcoming_shows": row[2],
+        } for row in rows],
+    }
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    # Columns of bulk exports, and those identifying a row in bulk loads
+    export_fields = ('id', 'name', 'city', 'state', 'address', 'phone',
+                     'genres', 'image_link', 'facebook_link', 'website_link',
+                     'seeking_talent', 'seeking_description')
+    natural_key = ('name', 'city', 'state')
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
-    city = db.Column(db.String(120))
+    city = db.Column(db.String(120), index=True)
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(string_array())
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(
         db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # Materialized show counts, kept up to date by Show.insert()/delete()
+    # and rolled forward as time passes by roll_show_counters()
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
     shows = db.relationship("Show", backref="venue")
-
-    def upcoming_shows(self):
-        return Show.query.join(Venue, Show.venue_id == self.id).filter(Show.start_time >= current_datetime)
-
-    def past_shows(self):
-        return Show.query.join(Venue, Show.venue_id == self.id).filter(Show.start_time < current_datetime)
-
-    def format_shows(self, shows_query):
-        shows = []
-        for show in shows_query:
-            shows.append(show.artist_format())
-        return shows
-
-    def preview_format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "num_upcoming_shows": len(self.format_shows(self.upcoming_shows())),
-        }
-
-    def details_format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "address": self.address,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "website": self.website_link,
-            "facebook_link": self.facebook_link,
-            "seeking_talent": self.seeking_talent,
-            "seeking_description": self.seeking_description,
-            "image_link": self.image_link,
-            "past_shows": self.format_shows(self.past_shows()),
-            "upcoming_shows": self.format_shows(self.upcoming_shows()),
-            "past_shows_count": len(self.format_shows(self.past_shows())),
-            "upcoming_shows_count": len(self.format_shows(self.upcoming_shows())),
-        }
+    # Bumped by every write to the row, API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False,
+                        default=1, server_default='1')
+
+    @classmethod
+    def search(cls, search_term, limit):
+        return search_format(cls, search_term, limit)
+
+    @classmethod
+    def areas_query(cls):
+        # One query for the whole listing: every venue with its upcoming
+        # show count, ordered so that venues of an area are adjacent.
+        return db.session.query(cls.id, cls.name, cls.city, cls.state,
+                                cls.upcoming_show_count, cls.version)\
+            .order_by(cls.city, cls.state, cls.id)
+
+    @classmethod
+    def areas_format(cls):
+        areas = []
+        for id, name, city, state, num_shows, version in cls.areas_query():
+            if not areas or areas[-1]["city"] != city or areas[-1]["state"] != state:
+                areas.append({
+                    "city": city,
+                    "state": state,
+                    "venues": [],
+                })
+            areas[-1]["venues"].append({
+                "id": id,
+                "name": name,
+                "num_upcoming_shows": num_shows,
+                "version": version,
+            })
+        return areas
+
+    def cache_keys(self):
+        # Cached pages that render this venue
+        return [('venues',), ('venue', self.id)] + \
+            [('artist', show.artist_id) for show in self.shows]
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        cache.invalidate(*self.cache_keys())
 
     def update(self):
         db.session.commit()
+        cache.invalidate(*self.cache_keys())
 
     def delete(self):
+        keys = self.cache_keys()
         db.session.delete(self)
         db.session.commit()
+        cache.invalidate(*keys)
+
+
+db.Index('ux_Venue_natural_key', *natural_key_index(Venue), unique=True)
 
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    # Columns of bulk exports, and those identifying a row in bulk loads
+    export_fields = ('id', 'name', 'city', 'state', 'phone', 'genres',
+                     'image_link', 'facebook_link', 'website_link',
+                     'seeking_venue', 'seeking_description')
+    natural_key = ('name', 'city', 'state')
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String(120)))
+    genres = db.Column(string_array())
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     # TODO: implement any missing fields, as a database migration using Flask-Migrate
@@ -101,56 +288,43 @@ class Artist(db.Model):
     seeking_venue = db.Column(
         db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
+    # Materialized show counts, kept up to date by Show.insert()/delete()
+    # and rolled forward as time passes by roll_show_counters()
+    upcoming_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_show_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
     shows = db.relationship("Show", backref="artist")
+    # Bumped by every write to the row, API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False,
+                        default=1, server_default='1')
 
-    def upcoming_shows(self):
-        return Show.query.join(Artist, Show.artist_id == self.id).filter(Show.start_time >= current_datetime)
-
-    def past_shows(self):
-        return Show.query.join(Artist, Show.artist_id == self.id).filter(Show.start_time < current_datetime)
+    @classmethod
+    def search(cls, search_term, limit):
+        return search_format(cls, search_term, limit)
 
-    def format_shows(self, shows_query):
-        shows = []
-        for show in shows_query:
-            shows.append(show.venue_format())
-        return shows
-
-    def preview_format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "num_upcoming_shows": len(self.format_shows(self.upcoming_shows())),
-        }
-
-    def details_format(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "genres": self.genres,
-            "city": self.city,
-            "state": self.state,
-            "phone": self.phone,
-            "seeking_venue": self.seeking_venue,
-            "image_link": self.image_link,
-            "seeking_description": self.seeking_description,
-            "past_shows": self.format_shows(self.past_shows()),
-            "upcoming_shows": self.format_shows(self.upcoming_shows()),
-            "past_shows_count": len(self.format_shows(self.past_shows())),
-            "upcoming_shows_count": len(self.format_shows(self.upcoming_shows())),
-            "website": self.website_link,
-            "facebook_link": self.facebook_link,
-        }
+    def cache_keys(self):
+        # Cached pages that render this artist
+        return [('artist', self.id)] + \
+            [('venue', show.venue_id) for show in self.shows]
 
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        cache.invalidate(*self.cache_keys())
 
     def update(self):
         db.session.commit()
+        cache.invalidate(*self.cache_keys())
 
     def delete(self):
+        keys = self.cache_keys()
         db.session.delete(self)
         db.session.commit()
+        cache.invalidate(*keys)
+
+
+db.Index('ux_Artist_natural_key', *natural_key_index(Artist), unique=True)
 
 
 # TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
@@ -158,35 +332,224 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        # Upcoming/past partitioning is always scoped to one venue or artist
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        # Keyset pagination order of the /shows listing
+        db.Index('ix_Show_start_time_id', 'start_time', 'id'),
+        db.Index('ux_Show_natural_key', 'venue_id', 'artist_id', 'start_time',
+                 unique=True),
+    )
+    # Columns of bulk exports, and those identifying a row in bulk loads
+    export_fields = ('id', 'venue_id', 'artist_id', 'start_time')
+    natural_key = ('venue_id', 'artist_id', 'start_time')
 
     id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.String)
+    start_time = db.Column(timestamptz())
     venue_id = db.Column(db.Integer, db.ForeignKey("Venue.id"))
     artist_id = db.Column(db.Integer, db.ForeignKey("Artist.id"))
-
-    def artist_format(self):
-        return {
-            "artist_id": self.artist_id,
-            "artist_name": self.artist.name,
-            "artist_image_link": self.artist.image_link,
-            "start_time": self.start_time,
-        }
-
-    def venue_format(self):
-        return {
-            "venue_id": self.venue_id,
-            "venue_name": self.venue.name,
-            "venue_image_link": self.venue.image_link,
-            "start_time": self.start_time,
-        }
+    # Bumped by every write to the row, API ETags are derived from it
+    version = db.Column(db.Integer, nullable=False,
+                        default=1, server_default='1')
+
+    @classmethod
+    def filter_listing(cls, query, date_from=None, date_to=None, city=None,
+                       venue_id=None, artist_id=None):
+        # Filters of the /shows listing, for a query joined to Venue
+        if date_from is not None:
+            query = query.filter(cls.start_time >= date_from)
+        if date_to is not None:
+            # date_to is inclusive of the whole day
+            query = query.filter(
+                cls.start_time < date_to + datetime.timedelta(days=1))
+        if city:
+            query = query.filter(Venue.city == city)
+        if venue_id is not None:
+            query = query.filter(cls.venue_id == venue_id)
+        if artist_id is not None:
+            query = query.filter(cls.artist_id == artist_id)
+        return query
+
+    @db.validates('start_time')
+    def validate_start_time(self, key, start_time):
+        # Naive times (e.g. from ShowForm) are taken as UTC so they compare
+        # with the aware datetimes read back from the timestamptz column
+        if start_time is not None and start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=datetime.timezone.utc)
+        return start_time
+
+    def cache_keys(self):
+        # Cached pages that render this show
+        return [('venue', self.venue_id), ('artist', self.artist_id)]
 
     def insert(self):
         db.session.add(self)
+        count_show(self.start_time, self.venue_id, self.artist_id, 1)
         db.session.commit()
+        cache.invalidate(*self.cache_keys())
 
     def update(self):
+        state = db.inspect(self)
+        previous = [
+            (state.attrs[key].history.deleted or [getattr(self, key)])[0]
+            for key in ('start_time', 'venue_id', 'artist_id')
+        ]
+        count_show(*previous, -1)
+        count_show(self.start_time, self.venue_id, self.artist_id, 1)
         db.session.commit()
+        cache.invalidate(('venue', previous[1]), ('artist', previous[2]),
+                         *self.cache_keys())
 
     def delete(self):
+        keys = self.cache_keys()
+        count_show(self.start_time, self.venue_id, self.artist_id, -1)
         db.session.delete(self)
         db.session.commit()
+        cache.invalidate(*keys)
+
+
+class ShowCounterState(db.Model):
+    # Single row holding the instant up to which the materialized show
+    # counters have been rolled forward: a show counts as upcoming if it
+    # starts at or after rolled_at. The row is inserted along with the table
+    # (by migration 9e3b5d27c0a1, or by create_all()).
+    __tablename__ = 'ShowCounterState'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(timestamptz(), nullable=False)
+
+    @classmethod
+    def get(cls, lock=False, share=False):
+        # With lock, the row stays locked until the end of the transaction:
+        # exclusively to move the watermark, or shared (share=True) to count
+        # shows against it, so that counting never races a roll
+        query = cls.query.filter_by(id=1)
+        if lock:
+            query = query.with_for_update(read=share)
+        return query.one()
+
+
+@event.listens_for(ShowCounterState.__table__, 'after_create')
+def insert_show_counter_state(table, connection, **kwargs):
+    connection.execute(table.insert().values(id=1, rolled_at=clock.now()))
+
+
+def count_show(start_time, venue_id, artist_id, delta):
+    # Add delta to the upcoming or past counter of the show's venue and
+    # artist, in the caller's transaction.
+    rolled_at = ShowCounterState.get(lock=True, share=True).rolled_at
+    upcoming = start_time >= rolled_at
+    for model, id in ((Venue, venue_id), (Artist, artist_id)):
+        column = model.upcoming_show_count if upcoming else model.past_show_count
+        db.session.query(model).filter(model.id == id)\
+            .update({column: column + delta, model.version: model.version + 1},
+                    synchronize_session=False)
+
+
+def add_to_counters(model, deltas):
+    # Apply {id: (upcoming delta, past delta)} to the show counters of a
+    # model with one executemany UPDATE, in the caller's transaction.
+    if not deltas:
+        return
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('row_id'))
+        .values(upcoming_show_count=table.c.upcoming_show_count + db.bindparam('upcoming'),
+                past_show_count=table.c.past_show_count + db.bindparam('past'),
+                version=table.c.version + 1),
+        [{"row_id": id, "upcoming": upcoming, "past": past}
+         for id, (upcoming, past) in deltas.items()])
+
+
+def recount_show_counters(model, show_fk, ids):
+    # Recount the show counters of the given venues or artists against the
+    # current watermark, in the caller's transaction
+    if not ids:
+        return
+    rolled_at = ShowCounterState.get(lock=True, share=True).rolled_at
+    counts = {id: (0, 0) for id in ids}
+    counts.update({
+        id: (upcoming, past)
+        for id, upcoming, past in db.session.query(
+            show_fk,
+            func.count(Show.id).filter(Show.start_time >= rolled_at),
+            func.count(Show.id).filter(Show.start_time < rolled_at))
+        .filter(show_fk.in_(ids))
+        .group_by(show_fk)
+    })
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('row_id'))
+        .values(upcoming_show_count=db.bindparam('upcoming'),
+                past_show_count=db.bindparam('past'),
+                version=table.c.version + 1),
+        [{"row_id": id, "upcoming": upcoming, "past": past}
+         for id, (upcoming, past) in counts.items()])
+
+
+def roll_show_counters():
+    # Move the shows that started since the last roll from the upcoming to
+    # the past counters. Returns the number of shows moved.
+    state = ShowCounterState.get(lock=True)
+    now = clock.now()
+    keys = []
+    for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        rows = db.session.query(show_fk, func.count(Show.id))\
+            .filter(Show.start_time >= state.rolled_at, Show.start_time < now)\
+            .group_by(show_fk)\
+            .all()
+        add_to_counters(model, {id: (-count, count) for id, count in rows})
+        keys += [(model.__tablename__.lower(), id) for id, count in rows]
+        if model is Venue:
+            moved = sum(count for id, count in rows)
+    state.rolled_at = now
+    db.session.commit()
+    cache.invalidate(*keys)
+    return moved
+
+
+def rebuild_show_counters():
+    # Recount every venue's and artist's shows from scratch. Returns the
+    # (table, id, stored, actual) of every row whose counters had drifted,
+    # with stored/actual as (upcoming, past) pairs.
+    state = ShowCounterState.get(lock=True)
+    now = clock.now()
+    drifted = []
+    for model, show_fk in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        actual = {
+            id: (upcoming, past)
+            for id, upcoming, past in db.session.query(
+                show_fk,
+                func.count(Show.id).filter(Show.start_time >= now),
+                func.count(Show.id).filter(Show.start_time < now))
+            .group_by(show_fk)
+        }
+        for id, upcoming, past in db.session.query(
+                model.id, model.upcoming_show_count, model.past_show_count):
+            counts = actual.get(id, (0, 0))
+            if counts != (upcoming, past):
+                drifted.append((model.__tablename__, id, (upcoming, past), counts))
+                db.session.query(model).filter(model.id == id).update({
+                    model.upcoming_show_count: counts[0],
+                    model.past_show_count: counts[1],
+                    model.version: model.version + 1,
+                }, synchronize_session=False)
+    state.rolled_at = now
+    db.session.commit()
+    cache.invalidate(*[(table.lower(), id) for table, id, stored, counts in drifted])
+    return drifted
+
+
+def bump_version(mapper, connection, target):
+    # Core statements (counters, bulk loads) bump version themselves
+    target.version = type(target).version + 1
+
+
+for versioned in (Venue, Artist, Show):
+    db.event.listen(versioned, 'before_update', bump_version)
+
+search.watch(Venue)
+search.watch(Artist)
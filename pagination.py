@@ -0,0 +1,64 @@
+import base64
+import datetime
+from sqlalchemy import tuple_
+from werkzeug.exceptions import BadRequest
+
+
+# Keyset cursors are the (start_time, id) of a boundary row, opaque to clients
+def encode_cursor(start_time, id):
+    raw = '%s|%d' % (start_time.isoformat(), id)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_time, id = base64.urlsafe_b64decode(
+            padded.encode()).decode().rsplit('|', 1)
+        return datetime.datetime.fromisoformat(start_time), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Invalid page cursor')
+
+
+def parse_date(value):
+    # Dates from filter forms (YYYY-MM-DD), taken as UTC midnight
+    if not value:
+        return None
+    try:
+        date = datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise BadRequest('Invalid date: ' + value)
+    return date.replace(tzinfo=datetime.timezone.utc)
+
+
+def keyset_page(query, columns, limit, after=None, before=None):
+    # Returns (rows, next_cursor, prev_cursor) for query ordered by columns,
+    # a (start_time, id) pair. One extra row is fetched to know whether
+    # another page exists in the direction we are moving.
+    key = tuple_(*columns)
+    if before is not None:
+        rows = query.filter(key < tuple_(*decode_cursor(before)))\
+            .order_by(*[column.desc() for column in columns])\
+            .limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        if after is not None:
+            query = query.filter(key > tuple_(*decode_cursor(after)))
+        rows = query.order_by(*columns).limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = after is not None
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(*_row_key(rows[-1], columns))
+    if rows and has_prev:
+        prev_cursor = encode_cursor(*_row_key(rows[0], columns))
+    return rows, next_cursor, prev_cursor
+
+
+def _row_key(row, columns):
+    return tuple(getattr(row, column.key) for column in columns)
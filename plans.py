@@ -0,0 +1,150 @@
+import datetime
+import json
+from sqlalchemy import func
+import clock
+import serializers
+from models import Artist, Show, Venue, db, exists_query, search_query
+
+# Query plan regression checks. The named queries below are built by the
+# same functions the views run; EXPLAIN (ANALYZE, FORMAT JSON) gives their
+# plans, whose shapes (node types, tables and indexes) are kept in a JSON
+# baseline. A check fails when, on a large table that a baseline plan
+# reached through an index, the new plan scans it sequentially or reaches
+# it from a nested loop it was not under before.
+
+BASELINE = 'benchmarks/plans.json'
+# Tables with fewer rows (as estimated by the planner) are never reported:
+# sequential scans are the right plan for them.
+LARGE_TABLE_ROWS = 10000
+PER_PAGE = 30
+SEARCH_LIMIT = 50
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+
+
+def sample():
+    # Parameters for the named queries: the busiest venue and artist, so
+    # that their show queries are the expensive ones, and a popular city
+    venue_id = db.session.query(Show.venue_id).group_by(Show.venue_id)\
+        .order_by(func.count().desc()).limit(1).scalar()
+    artist_id = db.session.query(Show.artist_id).group_by(Show.artist_id)\
+        .order_by(func.count().desc()).limit(1).scalar()
+    city = db.session.query(Venue.city).group_by(Venue.city)\
+        .order_by(func.count().desc()).limit(1).scalar()
+    name = db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+    return {
+        'venue_id': venue_id or 1,
+        'artist_id': artist_id or 1,
+        'city': city or '',
+        'term': (name or 'Park').split()[0],
+        'now': clock.now(),
+    }
+
+
+def named_queries(params):
+    now = params['now']
+    listing_order = (Show.start_time, Show.id)
+    return {
+        'areas': Venue.areas_query(),
+        'venue_past_shows': serializers.shows_query(
+            Venue, params['venue_id'], False, now),
+        'venue_upcoming_shows': serializers.shows_query(
+            Venue, params['venue_id'], True, now),
+        'artist_past_shows': serializers.shows_query(
+            Artist, params['artist_id'], False, now),
+        'artist_upcoming_shows': serializers.shows_query(
+            Artist, params['artist_id'], True, now),
+        'venue_search': search_query(Venue, params['term'], SEARCH_LIMIT),
+        'venue_search_location': search_query(
+            Venue, params['city'], SEARCH_LIMIT),
+        'artist_search': search_query(Artist, params['term'], SEARCH_LIMIT),
+        # First pages, as keyset_page() asks for them
+        'shows_listing': serializers.show_listing_query()
+        .order_by(*listing_order).limit(PER_PAGE + 1),
+        'shows_listing_by_city': serializers.show_listing_query(
+            city=params['city']).order_by(*listing_order).limit(PER_PAGE + 1),
+        'shows_listing_by_date': serializers.show_listing_query(
+            date_from=now, date_to=now + datetime.timedelta(days=7))
+        .order_by(*listing_order).limit(PER_PAGE + 1),
+        'venue_exists': exists_query(Venue, params['venue_id']),
+        'artist_exists': exists_query(Artist, params['artist_id']),
+    }
+
+
+def explain(query):
+    statement = query.statement.compile(dialect=db.session.bind.dialect)
+    result = db.session.connection().execute(
+        'EXPLAIN (ANALYZE, FORMAT JSON) ' + str(statement), statement.params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def nodes(plan, nested=False):
+    # (node, under a nested loop) for every node of the plan
+    yield plan, nested
+    nested = nested or plan['Node Type'] == 'Nested Loop'
+    for child in plan.get('Plans', ()):
+        yield from nodes(child, nested)
+
+
+def shape(plan):
+    return [{
+        'node': node['Node Type'],
+        'table': node.get('Relation Name'),
+        'index': node.get('Index Name'),
+        'nested': nested,
+    } for node, nested in nodes(plan)]
+
+
+def regressions(baseline, current, large_tables):
+    # Messages for the large tables the current plan reaches worse than the
+    # baseline did
+    indexed = {node['table'] for node in baseline
+               if node['node'] in INDEX_SCANS}
+    nested_before = {node['table'] for node in baseline if node['nested']}
+    messages = []
+    for table in sorted(indexed & large_tables):
+        scans = [node for node in current if node['table'] == table]
+        if any(node['node'] == 'Seq Scan' for node in scans):
+            messages.append('sequential scan on "%s", was an index scan'
+                            % table)
+        if table not in nested_before and any(node['nested']
+                                              for node in scans):
+            messages.append('nested loop over "%s", was not nested' % table)
+    return messages
+
+
+def large_tables(min_rows=LARGE_TABLE_ROWS):
+    names = [model.__tablename__ for model in (Venue, Artist, Show)]
+    rows = db.session.execute(
+        'SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:names)',
+        {'names': names})
+    return {name for name, reltuples in rows if reltuples >= min_rows}
+
+
+def capture():
+    # {name: {"sql", "shape"}} for every named query
+    plans = {}
+    for name, query in named_queries(sample()).items():
+        plans[name] = {
+            'sql': str(query.statement.compile(
+                dialect=db.session.bind.dialect)),
+            'shape': shape(explain(query)),
+        }
+    db.session.rollback()
+    return plans
+
+
+def check(baseline, plans, min_rows=LARGE_TABLE_ROWS):
+    # {name: [messages]} for the queries whose plan regressed
+    tables = large_tables(min_rows)
+    failures = {}
+    for name, plan in plans.items():
+        if name in baseline:
+            messages = regressions(baseline[name]['shape'], plan['shape'],
+                                   tables)
+            if messages:
+                failures[name] = messages
+    return failures
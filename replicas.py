@@ -0,0 +1,103 @@
+import random
+import time
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+
+# Read replica routing. SELECTs of GET and HEAD requests go to one of the
+# replica engines (configured as the SQLALCHEMY_BINDS 'replica_<n>'), every
+# other statement, and everything outside a request, to the primary. A user
+# who has just written reads from the primary for DB_STICKY_SECONDS, and
+# bypasses the cache (see cache.py), so their own change is visible even if
+# the replicas lag behind.
+
+BIND_PREFIX = 'replica_'
+# Session cookie key holding the time of the user's last write
+WRITTEN_AT = 'db_written_at'
+
+
+# On PostgreSQL, the reads of a GET or HEAD request run in one REPEATABLE
+# READ transaction: they all see the snapshot taken by the first, so that
+# e.g. an API ETag is computed from the same data as the body it tags.
+# concurrency.gather() shares that snapshot with its threads.
+SNAPSHOT_ISOLATION = 'REPEATABLE READ'
+
+# {engine: the engine's REPEATABLE READ variant}
+_snapshot_engines = {}
+
+
+def snapshot_engine(engine):
+    # Always the same object for an engine: the session keeps a connection
+    # per engine object
+    if engine not in _snapshot_engines:
+        _snapshot_engines.setdefault(engine, engine.execution_options(
+            isolation_level=SNAPSHOT_ISOLATION))
+    return _snapshot_engines[engine]
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('db_replica') if has_app_context() else None
+        if self._flushing or not isinstance(clause, (Select, type(None))):
+            # INSERT, UPDATE, DELETE and raw SQL
+            if has_app_context():
+                g.db_wrote = True
+            return SignallingSession.get_bind(self, mapper, clause)
+        if replica is not None:
+            engine = get_state(self.app).db.get_engine(self.app, bind=replica)
+        else:
+            engine = SignallingSession.get_bind(self, mapper, clause)
+        if has_app_context() and g.get('db_snapshot') \
+                and engine.dialect.name == 'postgresql':
+            return snapshot_engine(engine)
+        return engine
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def configure(app):
+    # Adds the replica URLs to the binds, before the extension is set up
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for number, url in enumerate(app.config.get('DATABASE_REPLICA_URLS', ())):
+        binds[BIND_PREFIX + str(number)] = url
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def replica_binds(app):
+    return sorted(key for key in app.config['SQLALCHEMY_BINDS']
+                  if key.startswith(BIND_PREFIX))
+
+
+def init_app(app):
+    @app.before_request
+    def share_snapshot():
+        if request.method in ('GET', 'HEAD'):
+            g.db_snapshot = True
+
+    replicas = replica_binds(app)
+    if not replicas:
+        return
+    sticky_seconds = app.config.get('DB_STICKY_SECONDS', 5)
+
+    @app.before_request
+    def choose_replica():
+        if request.method not in ('GET', 'HEAD'):
+            return
+        if time.time() - session.get(WRITTEN_AT, 0) < sticky_seconds:
+            # From the primary, and not from the cache, which may hold what a
+            # replica returned
+            g.db_sticky = True
+            return
+        g.db_replica = random.choice(replicas)
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote'):
+            session[WRITTEN_AT] = time.time()
+        return response
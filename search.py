@@ -0,0 +1,90 @@
+from collections import defaultdict
+from sqlalchemy import event, func
+
+
+def like_pattern(search_term, prefix=False):
+    # ILIKE pattern for a user supplied term, with its wildcards escaped
+    escaped = search_term.replace('\\', '\\\\')\
+        .replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%' if prefix else '%' + escaped + '%'
+
+
+def location(model):
+    # "City, ST" as a SQL expression. Must stay in sync with the trigram
+    # index expression created in migration 4c9a81f2d6e7.
+    return func.coalesce(model.city, '') + ', ' + func.coalesce(model.state, '')
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TrigramIndex:
+    # In-memory stand-in for the pg_trgm indexes, used when the database is
+    # not PostgreSQL (e.g. SQLite test runs). Matches and ranks the same way
+    # the SQL search does: substring of name or "City, ST", prefix matches
+    # of the name first, then by similarity.
+
+    def __init__(self, rows):
+        self.documents = {}
+        self.postings = defaultdict(set)
+        for id, name, city, state in rows:
+            name = name or ''
+            place = '%s, %s' % (city or '', state or '')
+            self.documents[id] = (name, name.lower(), place.lower())
+            for trigram in trigrams(name) | trigrams(place):
+                self.postings[trigram].add(id)
+
+    def candidates(self, term):
+        term_trigrams = trigrams(term)
+        if not term_trigrams:
+            return self.documents.keys()
+        postings = sorted((self.postings.get(trigram, set())
+                           for trigram in term_trigrams), key=len)
+        return set.intersection(*postings)
+
+    def match(self, search_term):
+        # Ranked list of matching ids
+        term = search_term.strip().lower()
+        ranked = []
+        for id in self.candidates(term):
+            name, lowered, place = self.documents[id]
+            if term not in lowered and term not in place:
+                continue
+            rank = max(similarity(lowered, term), similarity(place, term))
+            ranked.append(
+                (0 if lowered.startswith(term) else 1, -rank, name, id))
+        ranked.sort()
+        return [id for _, _, _, id in ranked]
+
+
+_indexes = {}
+
+
+def fallback_index(model, session):
+    if model not in _indexes:
+        _indexes[model] = TrigramIndex(session.query(
+            model.id, model.name, model.city, model.state))
+    return _indexes[model]
+
+
+def invalidate(model):
+    _indexes.pop(model, None)
+
+
+def watch(model):
+    # Drop the model's fallback index whenever one of its rows changes
+    # through the ORM; bulk writes call invalidate() themselves.
+    def on_change(mapper, connection, target):
+        invalidate(model)
+
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, on_change)
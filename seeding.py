@@ -0,0 +1,108 @@
+import datetime
+import itertools
+import random
+import cache
+import clock
+import search
+from importer import insert_statement
+from models import Artist, Show, Venue, db, rebuild_show_counters
+
+# Synthetic catalogue for benchmarks and load tests. Popularity is skewed
+# like real listings: the venue or artist of rank r (in a random order) gets
+# shows in proportion to 1 / r ** skew, so a few are very busy and most have
+# a handful of shows.
+
+# Named scales: (venues, artists, shows)
+SCALES = {
+    'small': (500, 1000, 10000),
+    'large': (20000, 50000, 1000000),
+}
+BATCH_SIZE = 10000
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Seattle', 'WA'),
+          ('Austin', 'TX'), ('Chicago', 'IL'), ('Portland', 'OR'),
+          ('Nashville', 'TN'), ('Boston', 'MA'), ('Denver', 'CO'),
+          ('Atlanta', 'GA')]
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic',
+          'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other']
+WORDS = ['Park', 'Square', 'Live', 'Music', 'Hall', 'Dueling', 'Pianos',
+         'Bar', 'Coffee', 'Club', 'Guns', 'Roses', 'Wild', 'Sax', 'Band',
+         'Lounge', 'Theatre', 'Garden', 'Blue', 'Moon', 'Electric', 'Velvet']
+
+
+def catalogue_rows(rng, count, **extra):
+    for number in range(count):
+        city, state = rng.choice(CITIES)
+        yield dict({
+            "name": '%s %d' % (' '.join(rng.sample(WORDS, 2)), number),
+            "city": city,
+            "state": state,
+            "phone": '%03d-%03d-%04d' % (rng.randrange(1000),
+                                         rng.randrange(1000),
+                                         rng.randrange(10000)),
+            "genres": rng.sample(GENRES, rng.randint(1, 3)),
+        }, **extra)
+
+
+def insert_rows(model, rows, batch_size=BATCH_SIZE):
+    # Rows already present (same natural key) are skipped
+    statement = insert_statement(model)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        db.session.execute(statement, batch)
+        db.session.commit()
+        count += len(batch)
+
+
+def skewed(rng, ids, skew):
+    # Function drawing k ids, the popular ones much more often
+    ids = list(ids)
+    rng.shuffle(ids)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank ** skew) for rank in range(1, len(ids) + 1)))
+    return lambda k: rng.choices(ids, cum_weights=cum_weights, k=k)
+
+
+def show_rows(rng, count, venue_ids, artist_ids, skew, past_days,
+              future_days):
+    now = clock.utcnow()
+    span = int(datetime.timedelta(days=past_days + future_days).total_seconds())
+    start = now - datetime.timedelta(days=past_days)
+    pick_venues = skewed(rng, venue_ids, skew)
+    pick_artists = skewed(rng, artist_ids, skew)
+    while count > 0:
+        batch = min(count, BATCH_SIZE)
+        for venue_id, artist_id in zip(pick_venues(batch),
+                                       pick_artists(batch)):
+            yield {
+                "venue_id": venue_id,
+                "artist_id": artist_id,
+                "start_time": start + datetime.timedelta(
+                    seconds=rng.randrange(span)),
+            }
+        count -= batch
+
+
+def seed(venues, artists, shows, skew=1.1, past_days=365, future_days=180,
+         random_seed=None):
+    # Adds the given numbers of venues, artists and shows (between past_days
+    # ago and future_days ahead), then recounts the show counters. The same
+    # random_seed on an empty database gives the same data.
+    rng = random.Random(random_seed)
+    insert_rows(Venue, catalogue_rows(rng, venues, seeking_talent=False))
+    insert_rows(Artist, catalogue_rows(rng, artists, seeking_venue=False))
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    if shows and venue_ids and artist_ids:
+        insert_rows(Show, show_rows(rng, shows, venue_ids, artist_ids, skew,
+                                    past_days, future_days))
+
+    rebuild_show_counters()
+    for model in (Venue, Artist):
+        search.invalidate(model)
+    cache.clear()
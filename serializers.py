@@ -0,0 +1,207 @@
+import datetime
+import json
+import clock
+import concurrency
+from models import Artist, Show, Venue, db
+from pagination import keyset_page
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fast path for listings and detail pages: only the columns a page needs are
+# selected, as plain tuples outside the identity map, and mapped into the
+# slotted records below. Records can be indexed like the dicts the templates
+# were written for, and are what the cache holds.
+
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, name):
+        # data['upcoming_shows'] as well as data.upcoming_shows
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+
+class Preview(Record):
+    __slots__ = ('id', 'name', 'num_upcoming_shows')
+
+
+class Tile(Record):
+    __slots__ = ('id', 'name', 'version')
+
+
+class ArtistShow(Record):
+    __slots__ = ('artist_id', 'artist_name', 'artist_image_link', 'start_time')
+
+
+class VenueShow(Record):
+    __slots__ = ('venue_id', 'venue_name', 'venue_image_link', 'start_time')
+
+
+class ShowListing(Record):
+    __slots__ = ('venue_id', 'venue_name', 'artist_id', 'artist_name',
+                 'artist_image_link', 'start_time')
+
+
+SHOW_COUNTS = ('past_shows', 'upcoming_shows',
+               'past_shows_count', 'upcoming_shows_count')
+
+
+class VenueDetails(Record):
+    __slots__ = ('id', 'name', 'genres', 'address', 'city', 'state', 'phone',
+                 'website', 'facebook_link', 'seeking_talent',
+                 'seeking_description', 'image_link') + SHOW_COUNTS
+
+
+class ArtistDetails(Record):
+    __slots__ = ('id', 'name', 'genres', 'city', 'state', 'phone',
+                 'seeking_venue', 'image_link', 'seeking_description') + \
+        SHOW_COUNTS + ('website', 'facebook_link')
+
+
+# Rows fetched per round trip by the listing pages' server-side cursors
+TILES_BATCH_SIZE = 1000
+
+# Per model: its details record and the fields named after another column,
+# then the record of one of its shows with the Show foreign key of the model
+# and the model on the other side of the show.
+DETAILS = {
+    Venue: (VenueDetails, {'website': 'website_link'},
+            ArtistShow, Show.venue_id, Artist, Show.artist_id),
+    Artist: (ArtistDetails, {'website': 'website_link'},
+             VenueShow, Show.artist_id, Venue, Show.venue_id),
+}
+
+
+def previews(model, after=None, limit=None):
+    # [Preview] ordered by id, optionally one keyset page after an id
+    query = db.session.query(
+        model.id, model.name, model.upcoming_show_count).order_by(model.id)
+    if after is not None:
+        query = query.filter(model.id > after)
+    if limit is not None:
+        query = query.limit(limit)
+    return [Preview(*row) for row in query]
+
+
+def tiles(model, batch_size=TILES_BATCH_SIZE):
+    # Yields a Tile for every row ordered by id, for listing pages. Rows are
+    # read through a server-side cursor (yield_per), batch_size at a time.
+    rows = db.session.query(model.id, model.name, model.version)\
+        .order_by(model.id).yield_per(batch_size)
+    for row in rows:
+        yield Tile(*row)
+
+
+def details(model, id):
+    # Details record of a venue or artist for its page.
+    # Its own row, its past shows and its upcoming shows are three
+    # independent column queries, run concurrently. None if there is no
+    # such row.
+    record, renamed, show_record, show_fk, counterpart, counterpart_fk = \
+        DETAILS[model]
+    fields = [name for name in record.__slots__ if name not in SHOW_COUNTS]
+    now = clock.now()
+
+    def entity():
+        return db.session.query(*[getattr(model, renamed.get(name, name))
+                                  for name in fields])\
+            .filter(model.id == id).first()
+
+    def shows(upcoming):
+        return [show_record(*show)
+                for show in shows_query(model, id, upcoming, now)]
+
+    row, past, upcoming = concurrency.gather(
+        entity, lambda: shows(False), lambda: shows(True))
+    if row is None:
+        return None
+
+    values = dict(zip(fields, row))
+    values.update(past_shows=past, upcoming_shows=upcoming,
+                  past_shows_count=len(past),
+                  upcoming_shows_count=len(upcoming))
+    return record(*[values[name] for name in record.__slots__])
+
+
+def shows_query(model, id, upcoming, now):
+    # (counterpart id, name, image link, start time) of the shows of a venue
+    # or artist starting from now (upcoming) or before it (past), the
+    # soonest and the latest first respectively
+    show_fk, counterpart, counterpart_fk = DETAILS[model][3:]
+    query = db.session.query(counterpart_fk, counterpart.name,
+                             counterpart.image_link, Show.start_time)\
+        .join(counterpart, counterpart_fk == counterpart.id)\
+        .filter(show_fk == id)
+    if upcoming:
+        return query.filter(Show.start_time >= now).order_by(Show.start_time)
+    return query.filter(Show.start_time < now)\
+        .order_by(Show.start_time.desc())
+
+
+def show_listing_query(**filters):
+    # Rows of show_listing(), before pagination
+    query = db.session.query(
+        Show.id, Show.start_time, Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.version,
+        Venue.version.label('venue_version'),
+        Artist.version.label('artist_version'))\
+        .join(Venue, Show.venue_id == Venue.id)\
+        .join(Artist, Show.artist_id == Artist.id)
+    return Show.filter_listing(query, **filters)
+
+
+def show_listing(limit, after=None, before=None, **filters):
+    # One page of the show listing as ([ShowListing], versions, next_cursor,
+    # prev_cursor), where versions holds the (id, show, venue, artist) row
+    # versions behind each record for ETags.
+    rows, next_cursor, prev_cursor = keyset_page(
+        show_listing_query(**filters), (Show.start_time, Show.id), limit, after=after, before=before)
+    records = [ShowListing(row.venue_id, row.venue_name, row.artist_id,
+                           row.artist_name, row.artist_image_link,
+                           row.start_time) for row in rows]
+    versions = [(row.id, row.version, row.venue_version, row.artist_version)
+                for row in rows]
+    return records, versions, next_cursor, prev_cursor
+
+
+def default(o):
+    if isinstance(o, Record):
+        return o.to_dict()
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+    raise TypeError('%r is not JSON serializable' % (o,))
+
+
+def dumps(data):
+    # JSON bytes of data, records and datetimes included; through orjson
+    # when it is installed.
+    if orjson is not None:
+        return orjson.dumps(data, default=default)
+    return json.dumps(data, default=default).encode('utf-8')
@@ -0,0 +1,42 @@
+from flask import (Response, current_app, get_flashed_messages,
+                   stream_with_context)
+
+# Streamed HTML for the pages listing whole tables. Flask 1.1 has no
+# stream_template(): the template is rendered as the response is sent, so
+# the layout head and the first rows go out while later rows are still being
+# fetched, and the page is never held in memory as a whole.
+#
+# The response's headers are sent before the body is rendered, so there is
+# no Server-Timing header: the request's log record and metrics are taken
+# when the server closes the response, once the body has been sent.
+
+# Template output is sent in chunks of about this many characters rather
+# than a write per tile
+CHUNK_SIZE = 8192
+
+
+def chunks(pieces, size=CHUNK_SIZE):
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_template(template_name, **context):
+    # Response rendering the template as it is sent, with the request
+    # context (and so the database session) kept until the last chunk
+    app = current_app._get_current_object()
+    # Flashed messages are taken out of the session now, while its cookie
+    # can still be sent; the layout gets them from the request context
+    get_flashed_messages()
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(chunks(template.generate(context))),
+                    mimetype='text/html')
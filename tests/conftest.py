@@ -0,0 +1,91 @@
+import contextlib
+import datetime
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search  # noqa: E402
+from config import TestingConfig  # noqa: E402
+from models import Artist, Show, Venue, db  # noqa: E402
+from wsgi import create_app  # noqa: E402
+
+# The tests run on the database of TEST_DATABASE_URL when it is set (it is
+# emptied), and on a throwaway SQLite file otherwise.
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    return os.environ.get('TEST_DATABASE_URL') or \
+        'sqlite:///%s' % (tmp_path / 'fyyur.db')
+
+
+@pytest.fixture
+def config(database_url):
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        TEMPLATE_WARM_UP = False
+    return Config
+
+
+@pytest.fixture
+def app(config):
+    app = create_app(config)
+    with app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            # Used by the search queries, created by a migration otherwise
+            db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            db.session.commit()
+        db.create_all()
+    for model in (Venue, Artist):
+        search.invalidate(model)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_venue(name, city='San Francisco', state='CA', **fields):
+    venue = Venue(name=name, city=city, state=state, genres=['Jazz'], **fields)
+    venue.insert()
+    return venue
+
+
+def add_artist(name, city='San Francisco', state='CA', **fields):
+    artist = Artist(name=name, city=city, state=state, genres=['Rock'],
+                    **fields)
+    artist.insert()
+    return artist
+
+
+def add_show(venue, artist, days_from_now):
+    show = Show(venue_id=venue.id, artist_id=artist.id,
+                start_time=datetime.datetime.now(datetime.timezone.utc) +
+                datetime.timedelta(days=days_from_now))
+    show.insert()
+    return show
+
+
+@contextlib.contextmanager
+def count_queries(app):
+    # [statement] of every query run in the block, by any thread
+    statements = []
+
+    def after_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'after_cursor_execute', after_cursor_execute)
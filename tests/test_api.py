@@ -0,0 +1,91 @@
+import pytest
+
+from conftest import add_artist, add_show, add_venue
+from models import Artist, Venue
+
+
+@pytest.mark.parametrize('limit', ['-1', '0'])
+def test_search_limit_is_at_least_one(app, client, limit):
+    with app.app_context():
+        add_venue('The Musical Hop')
+        add_venue('Park Square Live Music & Coffee')
+
+    response = client.get('/api/v1/venues/search',
+                          query_string={'q': 'music', 'limit': limit})
+
+    assert response.status_code == 200
+    assert response.json['count'] == 2
+    assert len(response.json['data']) == 1
+
+
+def test_list_etag_revalidates_until_a_row_changes(app, client):
+    with app.app_context():
+        venue_id = add_venue('The Musical Hop').id
+        add_venue('The Dueling Pianos Bar')
+
+    response = client.get('/api/v1/venues')
+    etag, weak = response.get_etag()
+    assert response.status_code == 200 and etag and not weak
+    assert [row['name'] for row in response.json['data']] == [
+        'The Musical Hop', 'The Dueling Pianos Bar']
+
+    cached = client.get('/api/v1/venues', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.get_etag() == (etag, False)
+    assert cached.data == b''
+
+    with app.app_context():
+        venue = Venue.query.get(venue_id)
+        venue.phone = '555-555-5555'
+        venue.update()
+    changed = client.get('/api/v1/venues', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.get_etag()[0] != etag
+
+
+def test_detail_etag_follows_the_shows(app, client):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        artist = add_artist('Guns N Petals')
+        add_show(venue, artist, days_from_now=3)
+        venue_id, artist_id = venue.id, artist.id
+    url = '/api/v1/venues/%d' % venue_id
+
+    response = client.get(url)
+    etag = response.get_etag()[0]
+    assert response.json['upcoming_shows_count'] == 1
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # A renamed artist changes the venue's shows
+    with app.app_context():
+        artist = Artist.query.get(artist_id)
+        artist.name = 'Guns N Roses'
+        artist.update()
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.json['upcoming_shows'][0]['artist_name'] == 'Guns N Roses'
+
+
+def test_fields_select_the_keys_returned(app, client):
+    with app.app_context():
+        venue_id = add_venue('The Musical Hop').id
+
+    listing = client.get('/api/v1/venues?fields=id,name')
+    details = client.get('/api/v1/venues/%d?fields=name,city' % venue_id)
+
+    assert listing.json['data'] == [{'id': venue_id,
+                                     'name': 'The Musical Hop'}]
+    assert details.json == {'name': 'The Musical Hop',
+                            'city': 'San Francisco'}
+    # The ETag covers the query arguments
+    assert listing.get_etag() != client.get('/api/v1/venues').get_etag()
+
+
+def test_errors_are_json(client):
+    missing = client.get('/api/v1/artists/1')
+    bad = client.get('/api/v1/shows?date_from=someday')
+
+    assert missing.status_code == 404
+    assert missing.json['error']
+    assert bad.status_code == 400
+    assert bad.json == {'error': 'Invalid date: someday'}
@@ -0,0 +1,128 @@
+import json
+import time
+
+import fakeredis
+import redis
+
+import cache
+from cache import LRUCache, RedisCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=1000)
+    cache.set(('page', 1), 'a' * 300)
+    cache.set(('page', 2), 'b' * 300)
+    cache.get(('page', 1))
+    cache.set(('page', 3), 'c' * 300)
+    cache.set(('page', 4), 'd' * 300)
+
+    assert cache.get(('page', 2)) is None
+    assert cache.get(('page', 1)) == 'a' * 300
+    assert cache.size <= 1000
+
+
+def test_lru_cache_counts_nested_values():
+    # A details value is a small dict holding long lists of shows
+    cache = LRUCache(max_bytes=10000)
+    details = {"upcoming_shows": [{"artist_name": '%d %s' % (i, 'x' * 100)}
+                                  for i in range(200)]}
+    cache.set(('details', 'venue', 1), details)
+
+    assert cache.get(('details', 'venue', 1)) is None
+    assert cache.size == 0
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_bytes=1000)
+    cache.set(('page', 1), 'a', ttl=-1)
+
+    assert cache.get(('page', 1)) is None
+    assert len(cache) == 0
+
+
+def test_redis_cache():
+    cache = RedisCache(fakeredis.FakeRedis())
+    cache.set(('page', 'venue', 1), '<html>')
+    cache.set(('details', 'venue', 1), {"id": 1, "genres": ['Jazz']}, ttl=60)
+
+    assert cache.get(('page', 'venue', 1)) == '<html>'
+    assert cache.get_many([('details', 'venue', 1), ('page', 'venue', 2)]) \
+        == [{"id": 1, "genres": ['Jazz']}, None]
+    assert 0 < cache.client.ttl('fyyur:details:venue:1') <= 60
+
+    cache.delete(('page', 'venue', 1))
+    assert cache.get(('page', 'venue', 1)) is None
+    cache.client.set('other:key', 'kept')
+    cache.clear()
+    assert cache.get(('details', 'venue', 1)) is None
+    assert cache.client.get('other:key') == b'kept'
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def next_message(pubsub, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.1)
+        if message is not None:
+            return message
+    raise AssertionError('no message')
+
+
+def test_invalidations_reach_other_workers(monkeypatch):
+    # This worker keeps its cache in memory and listens to the invalidation
+    # channel; another worker publishes on the same server.
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(cache, 'backend', LRUCache(max_bytes=100000))
+    monkeypatch.setattr(cache, 'publisher', None)
+    thread = cache.subscribe(fakeredis.FakeRedis(server=server))
+    other_worker = fakeredis.FakeRedis(server=server)
+    try:
+        wait_for(lambda: other_worker.pubsub_numsub(
+            cache.INVALIDATION_CHANNEL)[0][1] == 1)
+        cache.backend.set(('page', 'venue', 1), 'venue 1')
+        cache.backend.set(('page', 'venue', 2), 'venue 2')
+
+        other_worker.publish(cache.INVALIDATION_CHANNEL,
+                             json.dumps([['page', 'venue', 1]]))
+        wait_for(lambda: cache.backend.get(('page', 'venue', 1)) is None)
+        assert cache.backend.get(('page', 'venue', 2)) == 'venue 2'
+
+        other_worker.publish(cache.INVALIDATION_CHANNEL, json.dumps('*'))
+        wait_for(lambda: len(cache.backend) == 0)
+    finally:
+        thread.stop()
+
+
+def test_invalidate_publishes_keys(monkeypatch):
+    client = fakeredis.FakeRedis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(cache.INVALIDATION_CHANNEL)
+    monkeypatch.setattr(cache, 'backend', LRUCache(max_bytes=100000))
+    monkeypatch.setattr(cache, 'publisher', client)
+
+    cache.invalidate(('venue', 1))
+
+    message = next_message(pubsub)
+    assert [tuple(key) for key in json.loads(message['data'])] == [
+        (variant, 'venue', 1) for variant in cache.VARIANTS]
+
+
+def test_redis_backend_from_config(app, monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, 'from_url', classmethod(
+        lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    app.config.update(CACHE_BACKEND='redis',
+                      CACHE_REDIS_URL='redis://localhost:6379/0')
+    try:
+        cache.init_app(app)
+        assert isinstance(cache.backend, RedisCache)
+        assert cache.publisher is not None
+    finally:
+        app.config.update(CACHE_BACKEND='memory', CACHE_REDIS_URL=None)
+        cache.init_app(app)
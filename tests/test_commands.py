@@ -0,0 +1,33 @@
+import click
+import pytest
+from click.testing import CliRunner
+from flask import current_app
+from flask.cli import FlaskGroup, with_appcontext
+
+from config import ProductionConfig
+from wsgi import create_app
+
+
+def test_statement_timeout_only_applies_to_requests(config):
+    config.DB_STATEMENT_TIMEOUT = 5000
+    assert create_app(config).config['DB_STATEMENT_TIMEOUT'] == 5000
+
+    @click.command('timeout')
+    @with_appcontext
+    def timeout_command():
+        click.echo(current_app.config['DB_STATEMENT_TIMEOUT'])
+
+    cli = FlaskGroup(create_app=lambda: create_app(config))
+    cli.add_command(timeout_command)
+    result = CliRunner().invoke(cli, ['timeout'])
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == '0'
+
+
+def test_production_requires_a_database_url():
+    class Config(ProductionConfig):
+        SECRET_KEY = 'production'
+        SQLALCHEMY_DATABASE_URI = None
+
+    with pytest.raises(RuntimeError, match='DATABASE_URL'):
+        create_app(Config)
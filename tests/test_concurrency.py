@@ -0,0 +1,44 @@
+import pytest
+
+import concurrency
+from conftest import add_venue
+from models import Venue, db
+
+
+@pytest.fixture
+def venue_id(app):
+    app.config['DB_PARALLEL_QUERIES'] = 2
+    with app.app_context():
+        return add_venue('Before').id
+
+
+def venue_name(venue_id):
+    return db.session.query(Venue.name).filter(Venue.id == venue_id).scalar()
+
+
+def test_gather_runs_every_function(app, venue_id):
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert concurrency.gather(
+            lambda: venue_name(venue_id),
+            lambda: venue_name(venue_id + 1),
+            lambda: venue_name(venue_id)) == ['Before', None, 'Before']
+
+
+def test_gathered_queries_share_the_request_snapshot(app, venue_id):
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            pytest.skip('snapshots are only shared on PostgreSQL')
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        assert venue_name(venue_id) == 'Before'
+        # Committed by another connection once the request has read
+        with db.engine.begin() as connection:
+            connection.execute(Venue.__table__.update()
+                               .where(Venue.id == venue_id)
+                               .values(name='After'))
+
+        assert concurrency.gather(
+            lambda: venue_name(venue_id),
+            lambda: venue_name(venue_id)) == ['Before', 'Before']
@@ -0,0 +1,47 @@
+import datetime
+
+import clock
+from conftest import add_artist, add_show, add_venue
+from models import (Artist, ShowCounterState, Venue, db,
+                    rebuild_show_counters, roll_show_counters)
+
+
+def counters(model, id):
+    row = db.session.query(model.upcoming_show_count, model.past_show_count)\
+        .filter(model.id == id).one()
+    return tuple(row)
+
+
+def test_state_row_is_created_with_the_table(app):
+    with app.app_context():
+        assert ShowCounterState.query.count() == 1
+        assert ShowCounterState.get(lock=True, share=True).rolled_at
+
+
+def test_show_writes_update_counters(app):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        artist = add_artist('Guns N Petals')
+        show = add_show(venue, artist, days_from_now=1)
+        add_show(venue, artist, days_from_now=-1)
+
+        assert counters(Venue, venue.id) == (1, 1)
+        assert counters(Artist, artist.id) == (1, 1)
+
+        show.delete()
+        assert counters(Venue, venue.id) == (0, 1)
+
+
+def test_roll_moves_started_shows_to_past(app):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        artist = add_artist('Guns N Petals')
+        add_show(venue, artist, days_from_now=1)
+        add_show(venue, artist, days_from_now=3)
+
+        later = clock.utcnow() + datetime.timedelta(days=2)
+        with clock.freeze(later):
+            assert roll_show_counters() == 1
+            assert counters(Venue, venue.id) == (1, 1)
+            assert counters(Artist, artist.id) == (1, 1)
+            assert rebuild_show_counters() == []
@@ -0,0 +1,76 @@
+import datetime
+
+import babel.dates
+import pytest
+
+import dates
+
+NAIVE = datetime.datetime(2035, 4, 1, 20, 0)
+AWARE = datetime.datetime(2035, 4, 1, 20, 0, tzinfo=datetime.timezone(
+    datetime.timedelta(hours=-7)))
+# The same instant as AWARE, in UTC
+UTC = AWARE.astimezone(datetime.timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def clear():
+    dates.clear()
+    yield
+    dates.clear()
+
+
+@pytest.fixture
+def formats(monkeypatch):
+    # [key] of every date formatted outside the cache
+    keys = []
+    format = dates._format
+
+    def counting(key):
+        keys.append(key)
+        return format(key)
+
+    monkeypatch.setattr(dates, '_format', counting)
+    return keys
+
+
+@pytest.mark.parametrize('value', [NAIVE, AWARE, UTC])
+@pytest.mark.parametrize('name', sorted(dates.FORMATS))
+def test_output_matches_babel(name, value):
+    expected = babel.dates.format_datetime(value, dates.FORMATS[name],
+                                           locale=dates.LOCALE)
+
+    assert dates.format_datetime(value, name) == expected
+    assert dates.format_many([value], name) == [expected]
+
+
+def test_strings_are_parsed():
+    assert dates.format_datetime(AWARE.isoformat(), 'full') == \
+        dates.format_datetime(AWARE, 'full')
+
+
+def test_repeated_calls_hit_the_cache(formats):
+    first = dates.format_datetime(NAIVE, 'full')
+
+    assert dates.format_datetime(NAIVE, 'full') == first
+    assert dates.format_many([NAIVE, NAIVE], 'full') == [first, first]
+    assert len(formats) == 1
+    assert len(dates._results) == 1
+
+
+def test_same_instant_in_another_offset_is_formatted_again(formats):
+    assert dates.format_many([AWARE, UTC], 'full') == [
+        dates.format_datetime(AWARE, 'full'),
+        dates.format_datetime(UTC, 'full')]
+    assert len(formats) == 2
+
+
+def test_least_recently_used_results_are_dropped(monkeypatch, formats):
+    monkeypatch.setattr(dates, 'MAX_RESULTS', 2)
+    days = [NAIVE + datetime.timedelta(days=day) for day in range(3)]
+    for value in days:
+        dates.format_datetime(value)
+
+    dates.format_datetime(days[1])
+    assert len(formats) == 3
+    dates.format_datetime(days[0])
+    assert len(formats) == 4
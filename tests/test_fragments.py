@@ -0,0 +1,82 @@
+import pytest
+from prometheus_client import REGISTRY
+
+import fragments
+import serializers
+from conftest import add_artist, add_show, add_venue
+from models import Artist, Venue
+
+
+def lookups(result):
+    return REGISTRY.get_sample_value('fyyur_cache_lookups_total', {
+        'variant': 'fragment', 'result': result}) or 0
+
+
+@pytest.fixture
+def renders(app, monkeypatch):
+    # [template name] of every fragment rendered outside the cache
+    names = []
+    get_template = app.jinja_env.get_template
+
+    def counting(name, *args, **kwargs):
+        names.append(name)
+        return get_template(name, *args, **kwargs)
+
+    monkeypatch.setattr(app.jinja_env, 'get_template', counting)
+    return names
+
+
+def venue_tiles():
+    venues = list(serializers.tiles(Venue))
+    return fragments.render_each('fragments/venue_tile.html', 'venue', venues,
+                                 [(venue.id, venue.version)
+                                  for venue in venues])
+
+
+def show_tiles():
+    data, versions = serializers.show_listing(limit=10)[:2]
+    return list(fragments.render_stream('fragments/show_tile.html', 'show',
+                                        zip(data, versions), batch_size=1))
+
+
+def test_same_version_is_served_from_the_cache(app, renders):
+    with app.app_context():
+        add_venue('The Musical Hop')
+        first = venue_tiles()
+        hits, misses = lookups('hit'), lookups('miss')
+
+        assert venue_tiles() == first
+        assert renders == ['fragments/venue_tile.html']
+        assert lookups('hit') == hits + 1
+        assert lookups('miss') == misses
+
+
+def test_version_bump_renders_again(app, renders):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        venue_tiles()
+
+        venue.name = 'The Musical Hop II'
+        venue.update()
+        [tile] = venue_tiles()
+
+        assert 'The Musical Hop II' in tile
+        assert renders == ['fragments/venue_tile.html'] * 2
+
+
+@pytest.mark.parametrize('model', [Venue, Artist])
+def test_show_tiles_follow_venue_and_artist_versions(app, renders, model):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        artist = add_artist('Guns N Petals')
+        add_show(venue, artist, days_from_now=3)
+        show_tiles()
+        assert show_tiles() and len(renders) == 1
+
+        row = venue if model is Venue else artist
+        row.name = 'Renamed'
+        row.update()
+        [tile] = show_tiles()
+
+        assert 'Renamed' in tile
+        assert len(renders) == 2
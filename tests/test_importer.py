@@ -0,0 +1,123 @@
+import datetime
+import io
+import json
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import add_artist, add_show, add_venue
+from importer import import_catalogue, import_shows, read_records
+from models import Artist, Show, Venue, db
+
+
+def start(days_from_now):
+    return (datetime.datetime.now(datetime.timezone.utc) +
+            datetime.timedelta(days=days_from_now)).isoformat()
+
+
+def test_import_keeps_the_last_of_duplicate_records(app):
+    records = [
+        {"name": 'The Musical Hop', "city": 'San Francisco', "state": 'CA',
+         "phone": '123-123-1234'},
+        {"name": 'Bar Without State', "city": 'Austin', "state": ''},
+        {"name": 'The Musical Hop', "city": 'San Francisco', "state": 'CA',
+         "phone": '555-555-5555'},
+        {"name": 'Bar Without State', "city": 'Austin'},
+    ]
+    with app.app_context():
+        report = import_catalogue(Venue, records)
+
+        assert report.format() == {"loaded": 4, "error_count": 0,
+                                   "errors": []}
+        rows = db.session.query(Venue.name, Venue.state, Venue.phone)\
+            .order_by(Venue.name).all()
+        assert rows == [('Bar Without State', None, None),
+                        ('The Musical Hop', 'CA', '555-555-5555')]
+
+
+def test_natural_key_index_matches_missing_values(app):
+    # NULL states would never conflict in a plain unique index
+    with app.app_context():
+        db.session.add(Venue(name='Bar Without State', city='Austin'))
+        db.session.commit()
+        db.session.add(Venue(name='Bar Without State', city='Austin'))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_import_shows_rejects_bad_records_and_skips_duplicates(app):
+    with app.app_context():
+        venue = add_venue('The Musical Hop')
+        artist = add_artist('Guns N Petals')
+        existing = add_show(venue, artist, days_from_now=1)
+        twice = start(-3)
+        records = [
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": start(2)},
+            {"venue_id": venue.id + 1, "artist_id": artist.id,
+             "start_time": start(3)},
+            {"venue_id": venue.id, "artist_id": artist.id + 1,
+             "start_time": start(3)},
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": 'next tuesday-ish'},
+            {"venue_id": venue.id, "artist_id": artist.id},
+            # Already listed, and twice in the input
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": existing.start_time.isoformat()},
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": start(-2)},
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": twice},
+            {"venue_id": venue.id, "artist_id": artist.id,
+             "start_time": twice},
+        ]
+
+        # Batches of two: the valid records span three batches
+        report = import_shows(records, batch_size=2)
+
+        assert [error["record"] for error in report.errors] == [2, 3, 4, 5]
+        assert report.errors[0]["error"] == \
+            "Venue %d doesn't exist" % (venue.id + 1)
+        assert report.errors[1]["error"] == \
+            "Artist %d doesn't exist" % (artist.id + 1)
+        assert report.errors[3]["error"] == "Missing field 'start_time'"
+        assert report.loaded == 5
+        assert Show.query.count() == 4
+        # Recounted in the same transactions as the inserts
+        venue = Venue.query.get(venue.id)
+        assert (venue.upcoming_show_count, venue.past_show_count) == (2, 2)
+        artist = Artist.query.get(artist.id)
+        assert (artist.upcoming_show_count, artist.past_show_count) == (2, 2)
+
+
+def test_import_shows_upload(app, client):
+    with app.app_context():
+        venue_id = add_venue('The Musical Hop').id
+        artist_id = add_artist('Guns N Petals').id
+    body = '\n'.join([
+        json.dumps({"venue_id": venue_id, "artist_id": artist_id,
+                    "start_time": start(1)}),
+        '{"venue_id": ',
+        json.dumps({"venue_id": venue_id, "artist_id": artist_id,
+                    "start_time": start(-1)}),
+    ])
+
+    response = client.post('/shows/import?format=ndjson', data=body)
+
+    assert response.status_code == 200
+    assert response.json["loaded"] == 2
+    assert [error["record"] for error in response.json["errors"]] == [2]
+    assert response.json["errors"][0]["error"].startswith('Invalid record')
+    page = client.get('/venues/%d' % venue_id)
+    assert b'1 Upcoming Show<' in page.data
+    assert b'1 Past Show<' in page.data
+
+
+def test_read_records_of_a_csv_upload():
+    stream = io.BytesIO(b'venue_id,artist_id,start_time\n'
+                        b'1,2,2035-05-21T21:30:00\n')
+
+    assert list(read_records(stream, 'csv')) == [
+        {"venue_id": '1', "artist_id": '2',
+         "start_time": '2035-05-21T21:30:00'}]
@@ -0,0 +1,112 @@
+import json
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+
+import instrumentation
+from conftest import add_artist, add_venue
+from models import Venue, db
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def config(config):
+    config.N_PLUS_ONE_THRESHOLD = 3
+    return config
+
+
+@pytest.fixture
+def records():
+    handler = Records()
+    instrumentation.logger.addHandler(handler)
+    yield handler.records
+    instrumentation.logger.removeHandler(handler)
+
+
+def requests_total(endpoint):
+    return REGISTRY.get_sample_value('fyyur_requests_total', {
+        'endpoint': endpoint, 'method': 'GET', 'status': '200'}) or 0
+
+
+def test_page_is_logged_with_server_timing(app, client, records):
+    with app.app_context():
+        add_venue('The Musical Hop')
+
+    response = client.get('/venues')
+
+    assert 'desc="1 queries"' in response.headers['Server-Timing']
+    [record] = records
+    assert record['endpoint'] == 'main.venues'
+    assert record['queries'] == 1
+    assert record['size'] == len(response.data)
+
+
+def test_streamed_page_is_recorded_once_sent(app, client, records):
+    with app.app_context():
+        for number in range(3):
+            add_artist('Artist %d' % number)
+    requests_before = requests_total('main.artists')
+
+    response = client.get('/artists')
+
+    assert response.is_streamed
+    assert 'Server-Timing' not in response.headers
+    assert records == []
+    assert b'Artist 2' in response.get_data()
+    response.close()
+
+    [record] = records
+    assert record['endpoint'] == 'main.artists'
+    # The tiles query runs while the body is sent
+    assert record['queries'] >= 1
+    assert record['render_ms'] > 0
+    assert record['size'] is None
+    assert requests_total('main.artists') == requests_before + 1
+
+
+def test_render_time_excludes_nested_renders_and_queries(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(instrumentation.time, 'perf_counter', lambda: now[0])
+    stats = instrumentation.RequestStats()
+
+    page = stats.start_render()
+    now[0] = 1.0
+    fragment = stats.start_render()
+    stats.query('SELECT 1', 0.5)
+    now[0] = 3.0
+    stats.end_render(fragment)
+    now[0] = 4.0
+    stats.end_render(page)
+
+    assert stats.render_time == 3.5
+    assert stats.db_time == 0.5
+
+
+@pytest.mark.parametrize('times, flagged', [(3, False), (4, True)])
+def test_repeated_statements_are_flagged_above_the_threshold(
+        app, client, records, times, flagged):
+    @app.route('/repeat/<int:times>')
+    def repeat(times):
+        for id in range(times):
+            db.session.query(Venue.name).filter(Venue.id == id).first()
+        return 'done'
+
+    client.get('/repeat/%d' % times)
+
+    [record] = records
+    assert record['queries'] == times
+    assert ('n_plus_one' in record) is flagged
+    if flagged:
+        [repeated] = record['n_plus_one']
+        assert repeated['count'] == times
+        assert repeated['statement'].startswith('SELECT "Venue".name')
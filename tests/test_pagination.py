@@ -0,0 +1,97 @@
+import datetime
+
+import pytest
+
+from conftest import add_artist, add_show, add_venue
+
+
+@pytest.fixture
+def catalogue(app):
+    # Seven shows on consecutive days, from tomorrow, alternating between
+    # two venues (San Francisco, New York) and two artists
+    with app.app_context():
+        venues = [add_venue('The Musical Hop'),
+                  add_venue('The Dueling Pianos Bar', city='New York',
+                            state='NY')]
+        artists = [add_artist('Guns N Petals'), add_artist('Matt Quevedo')]
+        for day in range(7):
+            add_show(venues[day % 2], artists[day // 4], days_from_now=day + 1)
+        return {'venues': [venue.id for venue in venues],
+                'artists': [artist.id for artist in artists]}
+
+
+def listing(client, **args):
+    response = client.get('/api/v1/shows', query_string=args)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def keys(page):
+    return [(show['venue_id'], show['artist_id'], show['start_time'])
+            for show in page['data']]
+
+
+def test_pages_forward_and_back(client, catalogue):
+    pages = [listing(client, per_page=3)]
+    assert pages[0]['prev'] is None
+    while pages[-1]['next'] is not None:
+        pages.append(listing(client, per_page=3, after=pages[-1]['next']))
+
+    assert [len(page['data']) for page in pages] == [3, 3, 1]
+    forward = [key for page in pages for key in keys(page)]
+    assert forward == sorted(forward, key=lambda key: key[2])
+
+    backward = [pages[-1]]
+    while backward[-1]['prev'] is not None:
+        backward.append(listing(client, per_page=3,
+                                before=backward[-1]['prev']))
+    assert [keys(page) for page in reversed(backward)] == \
+        [keys(page) for page in pages]
+
+
+def test_last_page_has_no_next_cursor(client, catalogue):
+    page = listing(client, per_page=7)
+
+    assert len(page['data']) == 7
+    assert page['next'] is None
+
+
+@pytest.mark.parametrize('args', [
+    {'after': 'not-a-cursor'},
+    {'before': '!!'},
+    {'date_from': '2021-13-01'},
+    {'date_to': 'tomorrow'},
+])
+def test_bad_cursor_or_date_is_a_bad_request(client, catalogue, args):
+    response = client.get('/api/v1/shows', query_string=args)
+
+    assert response.status_code == 400
+    assert response.json['error']
+    assert client.get('/shows', query_string=args).status_code == 400
+
+
+def test_filters_narrow_the_listing(client, catalogue):
+    everything = keys(listing(client, per_page=100))
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    first_day = today + datetime.timedelta(days=2)
+    last_day = today + datetime.timedelta(days=4)
+
+    filtered = {
+        'city': keys(listing(client, city='New York')),
+        'venue_id': keys(listing(client,
+                                 venue_id=catalogue['venues'][0])),
+        'artist_id': keys(listing(client,
+                                  artist_id=catalogue['artists'][1])),
+        'dates': keys(listing(client, date_from=first_day.isoformat(),
+                              date_to=last_day.isoformat())),
+    }
+
+    assert len(everything) == 7
+    assert [venue for venue, artist, start in filtered['city']] == \
+        [catalogue['venues'][1]] * 3
+    assert [venue for venue, artist, start in filtered['venue_id']] == \
+        [catalogue['venues'][0]] * 4
+    assert [artist for venue, artist, start in filtered['artist_id']] == \
+        [catalogue['artists'][1]] * 3
+    # date_to covers the whole day
+    assert filtered['dates'] == everything[1:4]
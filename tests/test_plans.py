@@ -0,0 +1,53 @@
+from plans import regressions, shape
+
+
+def scan(node, table, index=None, **fields):
+    return dict({'Node Type': node, 'Relation Name': table,
+                 'Index Name': index}, **fields)
+
+
+def limit(*plans):
+    return {'Node Type': 'Limit', 'Plans': list(plans)}
+
+
+INDEXED = limit(scan('Index Scan', 'Show', 'ix_Show_start_time_id'))
+SEQUENTIAL = limit({'Node Type': 'Sort',
+                    'Plans': [scan('Seq Scan', 'Show')]})
+
+
+def test_shape_flattens_the_plan():
+    plan = {'Node Type': 'Nested Loop', 'Plans': [
+        scan('Index Scan', 'Show', 'ix_Show_venue_id_start_time'),
+        scan('Index Scan', 'Artist', 'Artist_pkey')]}
+
+    assert shape(limit(plan)) == [
+        {'node': 'Limit', 'table': None, 'index': None, 'nested': False},
+        {'node': 'Nested Loop', 'table': None, 'index': None,
+         'nested': False},
+        {'node': 'Index Scan', 'table': 'Show',
+         'index': 'ix_Show_venue_id_start_time', 'nested': True},
+        {'node': 'Index Scan', 'table': 'Artist', 'index': 'Artist_pkey',
+         'nested': True},
+    ]
+
+
+def test_sequential_scan_replacing_an_index_scan_is_reported():
+    assert regressions(shape(INDEXED), shape(SEQUENTIAL), {'Show'}) == [
+        'sequential scan on "Show", was an index scan']
+
+
+def test_unchanged_plan_is_not_reported():
+    assert regressions(shape(INDEXED), shape(INDEXED), {'Show'}) == []
+
+
+def test_small_tables_are_not_reported():
+    assert regressions(shape(INDEXED), shape(SEQUENTIAL), set()) == []
+
+
+def test_table_newly_under_a_nested_loop_is_reported():
+    nested = limit({'Node Type': 'Nested Loop', 'Plans': [
+        scan('Seq Scan', 'Venue'),
+        scan('Index Scan', 'Show', 'ix_Show_venue_id_start_time')]})
+
+    assert regressions(shape(INDEXED), shape(nested), {'Show'}) == [
+        'nested loop over "Show", was not nested']
@@ -0,0 +1,52 @@
+import pytest
+
+from conftest import add_venue
+from models import Venue, db
+
+# Two SQLite files stand in for the primary and its replica. Rows are
+# written to each directly, with different names, to tell which one a page
+# was read from.
+
+
+@pytest.fixture
+def config(config, database_url, tmp_path):
+    if not database_url.startswith('sqlite'):
+        pytest.skip('the replica is a SQLite file')
+    config.DATABASE_REPLICA_URLS = ['sqlite:///%s' % (tmp_path / 'replica.db')]
+    return config
+
+
+@pytest.fixture
+def venue_id(app):
+    with app.app_context():
+        venue_id = add_venue('Primary Hall').id
+        replica = db.get_engine(app, bind='replica_0')
+        db.Model.metadata.create_all(bind=replica)
+        replica.execute(Venue.__table__.insert().values(
+            id=venue_id, name='Replica Hall', city='San Francisco',
+            state='CA', genres=['Jazz']))
+    return venue_id
+
+
+def create_artist(client):
+    return client.post('/artists/create', data={
+        'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA',
+        'genres': 'Rock', 'facebook_link': 'https://www.facebook.com/gnp',
+    })
+
+
+def test_reads_go_to_the_replica(app, client, venue_id):
+    response = client.get('/venues/%d' % venue_id)
+
+    assert b'Replica Hall' in response.data
+
+
+def test_writer_reads_from_the_primary_and_not_the_cache(app, client,
+                                                         venue_id):
+    # Cached for everyone from the replica
+    assert b'Replica Hall' in client.get('/venues/%d' % venue_id).data
+
+    assert create_artist(client).status_code == 200
+    response = client.get('/venues/%d' % venue_id)
+
+    assert b'Primary Hall' in response.data
@@ -0,0 +1,58 @@
+from conftest import add_artist, add_venue
+from models import Artist, Venue
+from search import TrigramIndex
+
+
+def names(results):
+    return [row["name"] for row in results["data"]]
+
+
+def test_trigram_index_ranks_prefix_matches_first():
+    index = TrigramIndex([
+        (1, 'The Jazz Bar', 'Austin', 'TX'),
+        (2, 'Jazzy Lounge', 'Austin', 'TX'),
+        (3, 'Blue Moon', 'Austin', 'TX'),
+    ])
+
+    assert index.match('jazz') == [2, 1]
+    assert index.match('austin, tx') == [3, 2, 1]
+    assert index.match('zz') == [2, 1]
+    assert index.match('nothing') == []
+
+
+def test_search_matches_names_and_locations(app):
+    with app.app_context():
+        add_venue('The Musical Hop', city='San Francisco', state='CA')
+        add_venue('Park Square Live Music & Coffee', city='San Francisco',
+                  state='CA')
+        add_venue('The Dueling Pianos Bar', city='New York', state='NY')
+
+        assert names(Venue.search('Music', limit=10)) == [
+            'The Musical Hop', 'Park Square Live Music & Coffee']
+        results = Venue.search('new york, ny', limit=10)
+        assert results["count"] == 1
+        assert names(results) == ['The Dueling Pianos Bar']
+        # The count covers every match, the data only one page
+        results = Venue.search('san francisco', limit=1)
+        assert results["count"] == 2
+        assert len(results["data"]) == 1
+
+
+def test_search_sees_new_rows(app):
+    with app.app_context():
+        add_artist('Guns N Petals')
+        assert names(Artist.search('petal', limit=10)) == ['Guns N Petals']
+
+        add_artist('Petal Pushers')
+        assert names(Artist.search('petal', limit=10)) == [
+            'Petal Pushers', 'Guns N Petals']
+
+
+def test_search_page(client, app):
+    with app.app_context():
+        add_venue('The Musical Hop')
+
+    response = client.post('/venues/search', data={'search_term': 'hop'})
+
+    assert response.status_code == 200
+    assert b'The Musical Hop' in response.data
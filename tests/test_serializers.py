@@ -0,0 +1,49 @@
+import pytest
+
+import serializers
+from benchmarks.serializers import (original_details, original_previews,
+                                    original_show_listing)
+from conftest import add_artist, add_show, add_venue
+from models import Artist, Venue
+
+
+def plain(value):
+    # Records (and lists of them) as the dicts the original code built
+    if isinstance(value, serializers.Record):
+        return {name: plain(value[name]) for name in value.keys()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+@pytest.fixture
+def catalogue(app):
+    with app.app_context():
+        venues = [add_venue('The Musical Hop', address='1015 Folsom Street',
+                            website_link='https://www.themusicalhop.com'),
+                  add_venue('The Dueling Pianos Bar', city='New York',
+                            state='NY', seeking_talent=True,
+                            seeking_description='Pianists wanted')]
+        artists = [add_artist('Guns N Petals', seeking_venue=True,
+                              image_link='https://example.com/gnp.jpg'),
+                   add_artist('Matt Quevedo', city='New York', state='NY')]
+        for days in (-30, -5, 2, 9, 40):
+            add_show(venues[days % 2], artists[0], days_from_now=days)
+        add_show(venues[0], artists[1], days_from_now=-1)
+        return ([venue.id for venue in venues],
+                [artist.id for artist in artists])
+
+
+def test_serializers_match_the_original_formatters(app, catalogue):
+    venue_ids, artist_ids = catalogue
+    with app.test_request_context():
+        for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+            assert plain(serializers.previews(model)) == \
+                original_previews(model)
+            for id in ids:
+                assert plain(serializers.details(model, id)) == \
+                    original_details(model, id)
+        assert [(tile.id, tile.name) for tile in serializers.tiles(Artist)] \
+            == [(row['id'], row['name']) for row in original_previews(Artist)]
+        assert plain(serializers.show_listing(limit=10)[0]) == \
+            original_show_listing(10)
@@ -0,0 +1,39 @@
+from conftest import add_artist, add_show, add_venue, count_queries
+
+AREAS = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX')]
+
+
+def test_venues_page_is_a_single_query(app, client):
+    with app.app_context():
+        artist = add_artist('Guns N Petals')
+        for number in range(12):
+            city, state = AREAS[number % len(AREAS)]
+            venue = add_venue('Venue %d' % number, city=city, state=state)
+            add_show(venue, artist, days_from_now=number - 4)
+
+    with count_queries(app) as statements:
+        response = client.get('/venues')
+
+    assert response.status_code == 200
+    for city, state in AREAS:
+        assert ('%s, %s' % (city, state)).encode() in response.data
+    for number in range(12):
+        assert b'Venue %d<' % number in response.data
+    # Going back to one query per area or per venue (N+1) fails here
+    assert len(statements) == 1, statements
+
+
+def test_venue_page(app, client):
+    with app.app_context():
+        artist = add_artist('Guns N Petals')
+        venue = add_venue('The Musical Hop')
+        add_show(venue, artist, days_from_now=3)
+        add_show(venue, artist, days_from_now=-3)
+        venue_id = venue.id
+
+    response = client.get('/venues/%d' % venue_id)
+
+    assert response.status_code == 200
+    assert b'1 Upcoming Show<' in response.data
+    assert b'1 Past Show<' in response.data
+    assert client.get('/venues/%d' % (venue_id + 1)).status_code == 404
@@ -0,0 +1,41 @@
+import logging
+from logging import Formatter, FileHandler
+from flask import Flask
+import cache
+import commands
+import fragments
+import instrumentation
+import metrics
+from api import api
+from app import main
+from models import setup_db
+
+
+def create_app(config_object=None):
+    # The Fyyur app, configured from config_object or else the config class
+    # named by FYYUR_ENV (see config.py). Served by gunicorn through
+    # gunicorn.conf.py, or found by the flask command with FLASK_APP=wsgi.
+    app = Flask(__name__)
+
+    setup_db(app, config_object)
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    cache.init_app(app)
+    commands.init_app(app)
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    if app.config.get('TEMPLATE_WARM_UP', True):
+        fragments.warm_up(app)
+
+    if not app.debug and not app.testing:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app